@@ -0,0 +1,160 @@
+"""
+Cache of drafted updates keyed on normalized prompt content, so identical change summaries
+(re-runs after a crash, retried clients) skip the LLM. Backends: in-memory LRU or a DB table.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+from app.config import get_settings
+from app.db import SessionLocal
+from app.models.draft_cache import DraftCacheEntry
+
+settings = get_settings()
+
+
+def _norm(value: str | None) -> str:
+    return " ".join((value or "").split())
+
+
+def draft_cache_key(
+    client_display_name: str,
+    client_email: str | None,
+    company_context: str,
+    change_summary: str,
+) -> str:
+    parts = [_norm(client_display_name), _norm(client_email).lower(), _norm(company_context), _norm(change_summary)]
+    return hashlib.sha256("\x1f".join(parts).encode()).hexdigest()
+
+
+class DraftCache:
+    """Base: hit/miss accounting; subclasses implement _get/_put."""
+
+    def __init__(self, ttl_seconds: int, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max(max_entries, 1)
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    def get(self, key: str) -> dict | None:
+        draft = self._get(key)
+        with self._stats_lock:
+            if draft is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return draft
+
+    def put(self, key: str, draft: dict) -> None:
+        self._put(key, draft)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            total = self.hits + self.misses
+            return {
+                "backend": type(self).__name__,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+    def _get(self, key: str) -> dict | None:
+        return None
+
+    def _put(self, key: str, draft: dict) -> None:
+        pass
+
+
+class MemoryDraftCache(DraftCache):
+    """Per-process LRU with TTL."""
+
+    def __init__(self, ttl_seconds: int, max_entries: int):
+        super().__init__(ttl_seconds, max_entries)
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key: str) -> dict | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, draft = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return dict(draft)
+
+    def _put(self, key: str, draft: dict) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, dict(draft))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class DbDraftCache(DraftCache):
+    """Shared across processes via the draft_cache table; LRU by last_used_at."""
+
+    def _get(self, key: str) -> dict | None:
+        db = SessionLocal()
+        try:
+            now = datetime.now(timezone.utc)
+            row = db.get(DraftCacheEntry, key)
+            if row is None:
+                return None
+            expires_at = row.expires_at if row.expires_at.tzinfo else row.expires_at.replace(tzinfo=timezone.utc)
+            if expires_at < now:
+                db.delete(row)
+                db.commit()
+                return None
+            row.last_used_at = now
+            db.commit()
+            return json.loads(row.payload)
+        finally:
+            db.close()
+
+    def _put(self, key: str, draft: dict) -> None:
+        db = SessionLocal()
+        try:
+            now = datetime.now(timezone.utc)
+            db.merge(DraftCacheEntry(
+                key=key,
+                payload=json.dumps(draft),
+                expires_at=now + timedelta(seconds=self.ttl_seconds),
+                last_used_at=now,
+            ))
+            db.commit()
+            self._evict(db, now)
+        finally:
+            db.close()
+
+    def _evict(self, db, now: datetime) -> None:
+        db.query(DraftCacheEntry).filter(DraftCacheEntry.expires_at < now).delete(synchronize_session=False)
+        stale = (
+            db.query(DraftCacheEntry.key)
+            .order_by(DraftCacheEntry.last_used_at.desc())
+            .offset(self.max_entries)
+            .scalar_subquery()
+        )
+        db.query(DraftCacheEntry).filter(DraftCacheEntry.key.in_(stale)).delete(synchronize_session=False)
+        db.commit()
+
+
+_cache: DraftCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_draft_cache() -> DraftCache:
+    """Process-wide cache for settings.draft_cache_backend: memory | db | none."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            backends = {"memory": MemoryDraftCache, "db": DbDraftCache, "none": DraftCache}
+            cls = backends.get(settings.draft_cache_backend, MemoryDraftCache)
+            _cache = cls(settings.draft_cache_ttl_seconds, settings.draft_cache_max_entries)
+        return _cache
@@ -0,0 +1,78 @@
+"""
+Deterministic drafts for simple invoice changes (a few new invoices, a payment, a void),
+so the common cases skip the LLM. Anything else returns None and goes to the agent.
+"""
+from html import escape
+
+from app.config import get_settings
+
+settings = get_settings()
+
+TEMPLATE_EVENT_TYPES = ("new", "paid", "partially_paid", "voided")
+
+
+def _amount(v) -> str:
+    try:
+        return f"{float(v):,.2f}"
+    except (TypeError, ValueError):
+        return str(v or "")
+
+
+def _doc(inv: dict) -> str:
+    return str(inv.get("DocNumber") or inv.get("Id"))
+
+
+def _join(items: list[str]) -> str:
+    return items[0] if len(items) == 1 else ", ".join(items[:-1]) + " and " + items[-1]
+
+
+def _lines(event_type: str, invoices: list[dict]) -> tuple[str, list[str]]:
+    """(subject, body sentences) for events that all share event_type."""
+    docs = _join([_doc(i) for i in invoices])
+    plural = "s" if len(invoices) > 1 else ""
+    if event_type == "new":
+        details = _join([f"invoice {_doc(i)} for {_amount(i.get('TotalAmt'))}" for i in invoices])
+        return (
+            f"New invoice{plural} {docs}",
+            [f"We've issued {details}.", "Please let us know if you have any questions."],
+        )
+    if event_type == "paid":
+        return (
+            f"Payment received for invoice{plural} {docs}",
+            [f"We've received your payment in full for invoice{plural} {docs}.", "Thank you!"],
+        )
+    if event_type == "partially_paid":
+        inv = invoices[0]
+        return (
+            f"Payment received for invoice {docs}",
+            [
+                f"Thank you for your payment on invoice {docs}.",
+                f"The remaining balance is {_amount(inv.get('Balance'))}.",
+            ],
+        )
+    return (
+        f"Invoice{plural} {docs} voided",
+        [f"Invoice{plural} {docs} {'have' if plural else 'has'} been voided; no payment is due on {'them' if plural else 'it'}."],
+    )
+
+
+def render_template_draft(client_display_name: str, events: list[dict]) -> dict | None:
+    """
+    {"subject", "body_plain", "body_html"} when every event has the same simple type and
+    there are at most settings.template_max_events of them (one for partial payments);
+    otherwise None.
+    """
+    if not events or len(events) > settings.template_max_events:
+        return None
+    event_type = events[0]["type"]
+    if event_type not in TEMPLATE_EVENT_TYPES or any(e["type"] != event_type for e in events):
+        return None
+    if event_type == "partially_paid" and len(events) > 1:
+        return None
+    subject, sentences = _lines(event_type, [e["invoice"] for e in events])
+    greeting = f"Hi {client_display_name},"
+    return {
+        "subject": subject,
+        "body_plain": f"{greeting}\n\n{' '.join(sentences)}",
+        "body_html": f"<p>{escape(greeting)}</p><p>{escape(' '.join(sentences))}</p>",
+    }
@@ -3,6 +3,9 @@ Agno agent that drafts brief, professional client update emails from change summ
 No tools: we pass context and get back subject + body.
 """
 import json
+import logging
+import queue
+from typing import Callable
 from agno.agent import Agent
 try:
     from agno.models.openai.responses import OpenAIResponses
@@ -10,53 +13,160 @@ except ImportError:
     from agno.models.openai import OpenAIResponses
 
 from app.config import get_settings
+from app.agents.draft_cache import draft_cache_key, get_draft_cache
 
 settings = get_settings()
+logger = logging.getLogger(__name__)
+
+STYLE_INSTRUCTION = (
+    "You are a professional assistant that writes brief, friendly email updates "
+    "for business clients. Given a summary of what changed (e.g. new invoices, "
+    "milestone completions), draft a short email (2-4 sentences) that informs "
+    "the client without overwhelming detail. Tone: clear, professional, warm. "
+    "Do not invent data; only reference what is provided. "
+)
+DRAFT_SHAPE = '{"subject": "Subject line here", "body_plain": "Plain text body.", "body_html": "<p>HTML body.</p>"}'
+
+# Idle agents, reused across drafts. An Agent holds per-run state, so concurrent drafts
+# each check one out instead of sharing a single instance.
+_idle_agents: "queue.SimpleQueue[Agent]" = queue.SimpleQueue()
+_idle_batch_agents: "queue.SimpleQueue[Agent]" = queue.SimpleQueue()
 
 
 def create_update_agent() -> Agent:
+    return Agent(
+        model=OpenAIResponses(id="gpt-4o-mini"),
+        markdown=True,
+        instruction=STYLE_INSTRUCTION + "Respond with valid JSON only, in this exact shape: " + DRAFT_SHAPE,
+    )
+
+
+def create_batch_update_agent() -> Agent:
+    """Same voice as create_update_agent, but answers with one draft per client in a JSON array."""
     return Agent(
         model=OpenAIResponses(id="gpt-4o-mini"),
         markdown=True,
         instruction=(
-            "You are a professional assistant that writes brief, friendly email updates "
-            "for business clients. Given a summary of what changed (e.g. new invoices, "
-            "milestone completions), draft a short email (2-4 sentences) that informs "
-            "the client without overwhelming detail. Tone: clear, professional, warm. "
-            "Do not invent data; only reference what is provided. "
-            "Respond with valid JSON only, in this exact shape: "
-            '{"subject": "Subject line here", "body_plain": "Plain text body.", "body_html": "<p>HTML body.</p>"}'
+            STYLE_INSTRUCTION
+            + "You will be given several numbered clients; write one separate email per client, "
+            "never mixing details between clients. Respond with a valid JSON array only, one object "
+            'per client in the order given, each in this exact shape: {"index": 1, '
+            + DRAFT_SHAPE[1:]
         ),
     )
 
 
+def _run_agent(idle: "queue.SimpleQueue[Agent]", factory: Callable[[], Agent], prompt: str) -> str:
+    try:
+        agent = idle.get_nowait()
+    except queue.Empty:
+        agent = factory()
+    try:
+        response = agent.run(prompt)
+    finally:
+        idle.put(agent)
+    return response.content if hasattr(response, "content") else str(response)
+
+
+def _parse_json(text: str):
+    # Parse JSON from response (handle markdown code block)
+    text = text.strip()
+    if text.startswith("```"):
+        lines = text.split("\n")
+        text = "\n".join(lines[1:-1] if lines[-1].strip() == "```" else lines[1:])
+    return json.loads(text)
+
+
+def _to_draft(data: dict) -> dict:
+    return {
+        "subject": data.get("subject", "Update for you"),
+        "body_plain": data.get("body_plain", data.get("body_html", "")),
+        "body_html": data.get("body_html", data.get("body_plain", "")),
+    }
+
+
+def _client_block(client_display_name: str, client_email: str | None, change_summary: str, company_context: str) -> str:
+    return f"""Client name: {client_display_name}
+Contact email: {client_email or 'Not set'}
+{company_context}
+Changes to report:
+{change_summary}"""
+
+
 def draft_client_update(
     client_display_name: str,
     client_email: str | None,
     change_summary: str,
     company_context: str = "",
+    check_cache: bool = True,
 ) -> dict:
     """
     Returns {"subject": str, "body_plain": str, "body_html": str}.
+    Identical inputs (whitespace collapsed in every field, email compared case-insensitively)
+    are served from the draft cache; check_cache=False skips the lookup when the caller
+    already missed on the same inputs. The draft is cached either way.
     """
-    agent = create_update_agent()
-    prompt = f"""Client name: {client_display_name}
-Contact email: {client_email or 'Not set'}
-{company_context}
-Changes to report:
-{change_summary}
+    cache = get_draft_cache()
+    key = draft_cache_key(client_display_name, client_email, company_context, change_summary)
+    cached = cache.get(key) if check_cache else None
+    if cached is not None:
+        return cached
+    prompt = f"""{_client_block(client_display_name, client_email, change_summary, company_context)}
 
 Draft one brief email update. Output only the JSON object, no other text."""
-    response = agent.run(prompt)
-    text = response.content if hasattr(response, "content") else str(response)
-    # Parse JSON from response (handle markdown code block)
-    text = text.strip()
-    if text.startswith("```"):
-        lines = text.split("\n")
-        text = "\n".join(lines[1:-1] if lines[-1].strip() == "```" else lines[1:])
-    data = json.loads(text)
-    return {
-        "subject": data.get("subject", "Update for you"),
-        "body_plain": data.get("body_plain", data.get("body_html", "")),
-        "body_html": data.get("body_html", data.get("body_plain", "")),
+    draft = _to_draft(_parse_json(_run_agent(_idle_agents, create_update_agent, prompt)))
+    cache.put(key, draft)
+    return draft
+
+
+def draft_client_updates_batch(clients: list[dict]) -> list[dict | None]:
+    """
+    Draft several clients in one LLM call. Each item has the draft_client_update arguments
+    (client_display_name, client_email, change_summary, company_context).
+    Returns drafts in input order, cached ones included. An item is None when it was not
+    cached and the response had no usable draft for it, or the call failed (logged); the
+    caller should fall back to draft_client_update(..., check_cache=False).
+    """
+    cache = get_draft_cache()
+    keys = [
+        draft_cache_key(c["client_display_name"], c.get("client_email"), c.get("company_context", ""), c["change_summary"])
+        for c in clients
+    ]
+    results: list[dict | None] = [cache.get(key) for key in keys]
+    missing = [i for i, r in enumerate(results) if r is None]
+    if not missing:
+        return results
+
+    blocks = "\n\n".join(
+        f"Client {n}:\n" + _client_block(
+            clients[i]["client_display_name"],
+            clients[i].get("client_email"),
+            clients[i]["change_summary"],
+            clients[i].get("company_context", ""),
+        )
+        for n, i in enumerate(missing, start=1)
+    )
+    prompt = f"""{blocks}
+
+Draft one brief email update for each of the {len(missing)} clients above. Output only the JSON array of {len(missing)} objects, no other text."""
+    try:
+        data = _parse_json(_run_agent(_idle_batch_agents, create_batch_update_agent, prompt))
+        if not isinstance(data, list):
+            raise ValueError("Batch draft response is not a JSON array")
+    except Exception:
+        logger.exception("Batch draft failed for %d clients", len(missing))
+        return results
+
+    # Match by "index" when the model returned it; otherwise by position if the count is right
+    by_index = {
+        item["index"]: item for item in data
+        if isinstance(item, dict) and isinstance(item.get("index"), int)
     }
+    positional = len(data) == len(missing)
+    for n, i in enumerate(missing, start=1):
+        item = by_index.get(n) or (data[n - 1] if positional and not by_index else None)
+        if not isinstance(item, dict) or not (item.get("body_plain") or item.get("body_html")):
+            continue
+        results[i] = _to_draft(item)
+        cache.put(keys[i], results[i])
+    return results
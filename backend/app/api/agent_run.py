@@ -1,20 +1,106 @@
-from fastapi import APIRouter, Depends
+import json
+import queue
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from app.db import get_db
+from app.db import get_db, SessionLocal
 from app.auth.deps import get_current_user
 from app.models.tenant import User
-from app.services.agent_service import run_agent_for_tenant
-from app.schemas.pending_update import PendingUpdateOut
-from app.api.pending_updates import _enrich
+from app.models.agent_run import AgentRun
+from app.services.agent_run_service import ACTIVE_STATUSES, enqueue_agent_run, get_active_run
+from app.agents.draft_cache import get_draft_cache
+from app.schemas.agent_run import AgentRunOut
 
 router = APIRouter(prefix="/api/agent", tags=["agent"])
 
+STREAM_HEARTBEAT_SECONDS = 15
 
-@router.post("/run", response_model=list[PendingUpdateOut])
+
+def _run_out(run: AgentRun) -> AgentRunOut:
+    return AgentRunOut(
+        id=run.id,
+        tenant_id=run.tenant_id,
+        status=run.status,
+        clients_total=run.clients_total or 0,
+        clients_processed=run.clients_processed or 0,
+        created_update_ids=json.loads(run.created_update_ids) if run.created_update_ids else [],
+        error=run.error,
+        created_at=run.created_at,
+        started_at=run.started_at,
+        finished_at=run.finished_at,
+    )
+
+
+@router.post("/run", response_model=AgentRunOut, status_code=202)
 def run_agent(
     user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
-    """Run the agent for the current tenant: sync QB, detect changes, draft updates."""
-    created = run_agent_for_tenant(db, user.tenant_id)
-    return [_enrich(p, db) for p in created]
+    """
+    Queue an agent run for the current tenant (sync QB, detect changes, draft updates).
+    Returns immediately; poll GET /api/agent/runs/{id} for progress.
+    """
+    run = enqueue_agent_run(db, user.tenant_id)
+    return _run_out(run)
+
+
+@router.post("/run/stream")
+def run_agent_stream(
+    user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    Queue an agent run and stream its events as NDJSON, one JSON object per line:
+    queued, status, progress (clients scanned, changes found, drafts in flight),
+    update (a PendingUpdateOut, as soon as it is committed), then done or error.
+    """
+    if get_active_run(db, user.tenant_id):
+        raise HTTPException(409, detail="An agent run is already in progress")
+    events: queue.Queue = queue.Queue()
+    run = enqueue_agent_run(db, user.tenant_id, listener=events.put)
+    run_id = run.id
+    first = {"event": "queued", "run": _run_out(run).model_dump(mode="json")}
+
+    def ndjson():
+        yield json.dumps(first) + "\n"
+        while True:
+            try:
+                event = events.get(timeout=STREAM_HEARTBEAT_SECONDS)
+            except queue.Empty:
+                # Keeps proxies from closing the connection during long drafts, and ends the
+                # stream if the run finished without our listener (lost an enqueue race)
+                session = SessionLocal()
+                try:
+                    status = session.query(AgentRun.status).filter(AgentRun.id == run_id).scalar()
+                finally:
+                    session.close()
+                if status not in ACTIVE_STATUSES:
+                    yield json.dumps({"event": "done", "run_id": run_id, "status": status}) + "\n"
+                    return
+                event = {"event": "heartbeat", "run_id": run_id}
+            yield json.dumps(event) + "\n"
+            if event["event"] in ("done", "error"):
+                return
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+
+@router.get("/runs/{run_id}", response_model=AgentRunOut)
+def get_run(
+    run_id: str,
+    user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    row = db.query(AgentRun).filter(
+        AgentRun.id == run_id,
+        AgentRun.tenant_id == user.tenant_id,
+    ).first()
+    if not row:
+        raise HTTPException(404, detail="Run not found")
+    return _run_out(row)
+
+
+@router.get("/draft-cache")
+def draft_cache_stats(user: User = Depends(get_current_user)):
+    """Process-wide draft cache hits/misses since startup (LLM calls saved = hits)."""
+    return get_draft_cache().stats()
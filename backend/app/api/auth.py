@@ -6,7 +6,7 @@ from sqlalchemy.orm import Session
 from app.db import get_db
 from app.models.tenant import Tenant, User
 from app.auth.jwt import create_access_token
-from app.auth.password import hash_password, verify_password
+from app.auth.password import hash_password, verify_and_update_password
 from app.auth.cookies import (
     set_refresh_cookie,
     clear_refresh_cookie,
@@ -75,8 +75,15 @@ def register(data: UserCreate, db: Session = Depends(get_db)):
 @router.post("/login")
 def login(data: UserLogin, db: Session = Depends(get_db)):
     user = db.query(User).filter(User.email == data.email).first()
-    if not user or not user.hashed_password or not verify_password(data.password, user.hashed_password):
+    if not user or not user.hashed_password:
         raise HTTPException(status_code=401, detail="Invalid email or password")
+    valid, new_hash = verify_and_update_password(data.password, user.hashed_password)
+    if not valid:
+        raise HTTPException(status_code=401, detail="Invalid email or password")
+    if new_hash:
+        # bcrypt_rounds changed since this hash was made
+        user.hashed_password = new_hash
+        db.commit()
     tenant = db.query(Tenant).filter(Tenant.id == user.tenant_id).first()
     if not tenant or not tenant.is_active:
         raise HTTPException(status_code=403, detail="Tenant inactive")
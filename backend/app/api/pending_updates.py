@@ -1,43 +1,190 @@
 from datetime import datetime, timezone
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import insert, tuple_, update
+from sqlalchemy.orm import Session, defer
 from app.db import get_db
 from app.auth.deps import get_current_user
 from app.models.tenant import User
-from app.models.client import Client, PendingUpdate, UpdateHistory
-from app.schemas.pending_update import PendingUpdateOut, PendingUpdateEdit
+from app.models.client import Client, PendingUpdate, UpdateHistory, uuid_str
+from app.models.email_outbox import EmailOutbox
+from app.services.email_service import enqueue_email, outbox_row
+from app.schemas.pending_update import (
+    BulkItemResult,
+    BulkResultOut,
+    PendingUpdateBulk,
+    PendingUpdateEdit,
+    PendingUpdateOut,
+)
 
 router = APIRouter(prefix="/api/pending-updates", tags=["pending-updates"])
 
 
-def _enrich(p: PendingUpdate, db: Session) -> PendingUpdateOut:
-    client = db.query(Client).filter(Client.id == p.client_id).first()
+def _with_client(db: Session):
+    """PendingUpdate rows with their client's display name and email, in the same query."""
+    return db.query(PendingUpdate, Client.display_name, Client.email).outerjoin(
+        Client, Client.id == PendingUpdate.client_id
+    )
+
+
+def _enrich(
+    p: PendingUpdate,
+    client_display_name: str | None,
+    client_email: str | None,
+    include_body: bool = True,
+) -> PendingUpdateOut:
     return PendingUpdateOut(
         id=p.id,
         tenant_id=p.tenant_id,
         client_id=p.client_id,
         subject=p.subject,
-        body_html=p.body_html,
-        body_plain=p.body_plain,
+        body_html=p.body_html if include_body else None,
+        body_plain=p.body_plain if include_body else None,
         change_summary=p.change_summary,
+        draft_source=p.draft_source,
         status=p.status,
         created_at=p.created_at,
-        client_display_name=client.display_name if client else None,
-        client_email=client.email if client else None,
+        client_display_name=client_display_name,
+        client_email=client_email,
     )
 
 
+def _get_enriched(db: Session, tenant_id: str, update_id: str) -> PendingUpdateOut | None:
+    row = _with_client(db).filter(
+        PendingUpdate.id == update_id,
+        PendingUpdate.tenant_id == tenant_id,
+    ).first()
+    return _enrich(*row) if row else None
+
+
 @router.get("", response_model=list[PendingUpdateOut])
 def list_pending(
+    response: Response,
     status: str | None = None,
+    limit: int = Query(100, ge=1, le=500),
+    cursor: str | None = None,
+    include_body: bool = True,
     user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
-    q = db.query(PendingUpdate).filter(PendingUpdate.tenant_id == user.tenant_id)
+    """
+    Newest first, one page of at most `limit` rows. When more rows follow, the X-Next-Cursor
+    header holds the value to pass as `cursor` for the next page; a cursor that names no row
+    of the tenant (malformed, or its update was deleted) is a 400, not an empty page.
+    include_body=false omits body_html/body_plain (not even read from the database).
+    """
+    q = _with_client(db).filter(PendingUpdate.tenant_id == user.tenant_id)
     if status:
         q = q.filter(PendingUpdate.status == status)
-    rows = q.order_by(PendingUpdate.created_at.desc()).all()
-    return [_enrich(r, db) for r in rows]
+    if cursor:
+        known = (
+            db.query(PendingUpdate.id)
+            .filter(PendingUpdate.id == cursor, PendingUpdate.tenant_id == user.tenant_id)
+            .first()
+        )
+        if not known:
+            raise HTTPException(400, detail="Invalid cursor; restart from the first page")
+        # Keyset: rows strictly after the cursor row in (created_at, id) order; compared against
+        # the stored created_at so no timestamp round-trips through the cursor
+        cursor_created = (
+            db.query(PendingUpdate.created_at)
+            .filter(PendingUpdate.id == cursor, PendingUpdate.tenant_id == user.tenant_id)
+            .scalar_subquery()
+        )
+        q = q.filter(tuple_(PendingUpdate.created_at, PendingUpdate.id) < tuple_(cursor_created, cursor))
+    if not include_body:
+        q = q.options(defer(PendingUpdate.body_html), defer(PendingUpdate.body_plain))
+    rows = q.order_by(PendingUpdate.created_at.desc(), PendingUpdate.id.desc()).limit(limit + 1).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = rows[-1][0].id
+    return [_enrich(*r, include_body=include_body) for r in rows]
+
+
+def _transition_pending(db: Session, tenant_id: str, ids: list[str], status: str, **values) -> list:
+    """
+    Move the tenant's still-pending updates among ids to status in one UPDATE. Returns
+    (id, client_id, subject, change_summary, body_html, body_plain) for the rows that actually
+    changed, so a row already handled by a concurrent request is never counted twice.
+    """
+    cols = (
+        PendingUpdate.id,
+        PendingUpdate.client_id,
+        PendingUpdate.subject,
+        PendingUpdate.change_summary,
+        PendingUpdate.body_html,
+        PendingUpdate.body_plain,
+    )
+    where = (PendingUpdate.tenant_id == tenant_id, PendingUpdate.status == "pending", PendingUpdate.id.in_(ids))
+    stmt = update(PendingUpdate).where(*where).values(status=status, **values)
+    opts = {"synchronize_session": False}
+    if db.get_bind().dialect.update_returning:
+        return db.execute(stmt.returning(*cols), execution_options=opts).all()
+    rows = db.query(*cols).filter(*where).with_for_update().all()
+    if rows:
+        db.execute(stmt.where(PendingUpdate.id.in_([r.id for r in rows])), execution_options=opts)
+    return rows
+
+
+def _bulk_result(
+    ids: list[str],
+    done: set[str],
+    detail: str,
+    done_details: dict[str, str] | None = None,
+) -> BulkResultOut:
+    """done_details: optional note for ids that succeeded (e.g. no email will be sent)."""
+    done_details = done_details or {}
+    results = [
+        BulkItemResult(id=i, ok=i in done, detail=done_details.get(i) if i in done else detail) for i in ids
+    ]
+    return BulkResultOut(succeeded=len(done), failed=len(ids) - len(done), results=results)
+
+
+@router.post("/bulk/send", response_model=BulkResultOut)
+def bulk_approve_and_send(
+    data: PendingUpdateBulk,
+    user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """approve_and_send for many ids: one UPDATE, bulk history and outbox inserts, one commit."""
+    ids = list(dict.fromkeys(data.ids))
+    now = datetime.now(timezone.utc)
+    rows = _transition_pending(db, user.tenant_id, ids, "sent", sent_at=now)
+    emails: dict[str, str | None] = {}
+    if rows:
+        emails = dict(
+            db.query(Client.id, Client.email).filter(Client.id.in_({r.client_id for r in rows})).all()
+        )
+        db.execute(insert(EmailOutbox), [
+            outbox_row(user.tenant_id, emails.get(r.client_id), r.subject, r.body_html, r.body_plain, r.id)
+            for r in rows
+        ])
+        db.execute(insert(UpdateHistory), [
+            {
+                "id": uuid_str(),
+                "tenant_id": user.tenant_id,
+                "client_id": r.client_id,
+                "pending_update_id": r.id,
+                "subject": r.subject,
+                "change_summary": r.change_summary,
+            }
+            for r in rows
+        ])
+    db.commit()
+    no_email = {r.id: "Client has no email address; no email will be sent" for r in rows if not emails.get(r.client_id)}
+    return _bulk_result(ids, {r.id for r in rows}, "Update not found or not pending", no_email)
+
+
+@router.post("/bulk/reject", response_model=BulkResultOut)
+def bulk_reject(
+    data: PendingUpdateBulk,
+    user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Reject many pending updates with one UPDATE."""
+    ids = list(dict.fromkeys(data.ids))
+    rows = _transition_pending(db, user.tenant_id, ids, "rejected")
+    db.commit()
+    return _bulk_result(ids, {r.id for r in rows}, "Update not found or not pending")
 
 
 @router.get("/{update_id}", response_model=PendingUpdateOut)
@@ -46,13 +193,10 @@ def get_pending(
     user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
-    row = db.query(PendingUpdate).filter(
-        PendingUpdate.id == update_id,
-        PendingUpdate.tenant_id == user.tenant_id,
-    ).first()
-    if not row:
+    out = _get_enriched(db, user.tenant_id, update_id)
+    if not out:
         raise HTTPException(404, detail="Update not found")
-    return _enrich(row, db)
+    return out
 
 
 @router.patch("/{update_id}", response_model=PendingUpdateOut)
@@ -76,8 +220,7 @@ def edit_pending(
     if data.body_plain is not None:
         row.body_plain = data.body_plain
     db.commit()
-    db.refresh(row)
-    return _enrich(row, db)
+    return _get_enriched(db, user.tenant_id, update_id)
 
 
 @router.delete("/{update_id}")
@@ -103,7 +246,7 @@ def approve_and_send(
     user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
-    """Mark as sent and record in history. (Actual email sending can be added later.)"""
+    """Mark as sent, record in history and queue the email (outbox), in one transaction."""
     row = db.query(PendingUpdate).filter(
         PendingUpdate.id == update_id,
         PendingUpdate.tenant_id == user.tenant_id,
@@ -121,5 +264,22 @@ def approve_and_send(
         change_summary=row.change_summary,
     )
     db.add(history)
+    client = db.get(Client, row.client_id)
+    to_address = client.email if client else None
+    enqueue_email(
+        db,
+        user.tenant_id,
+        to_address,
+        row.subject,
+        row.body_html,
+        row.body_plain,
+        pending_update_id=row.id,
+    )
     db.commit()
-    return {"ok": True, "message": "Update marked as sent."}
+    if not to_address:
+        return {
+            "ok": True,
+            "email_queued": False,
+            "message": "Update marked as sent, but the client has no email address, so no email will be sent.",
+        }
+    return {"ok": True, "email_queued": True, "message": "Update marked as sent and queued for delivery."}
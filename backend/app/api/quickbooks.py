@@ -10,8 +10,9 @@ from app.services.quickbooks_service import (
     get_authorization_url,
     exchange_code_for_tokens,
     get_valid_connection,
+    invalidate_credentials,
 )
-from app.services.quickbooks_service import sync_clients_from_qb
+from app.services.quickbooks_service import QBQueryIncomplete, sync_clients_from_qb
 
 router = APIRouter(prefix="/api/qb", tags=["quickbooks"])
 
@@ -62,6 +63,7 @@ def qb_oauth_callback(
         )
         db.add(conn)
         db.commit()
+    invalidate_credentials(tenant_id)
     # Redirect to frontend so user lands back in the app
     return RedirectResponse(url="http://localhost:5173/dashboard?qb=connected", status_code=302)
 
@@ -81,5 +83,10 @@ def sync_clients(
     db: Session = Depends(get_db),
 ):
     """Sync clients from QuickBooks to local Client table."""
-    clients = sync_clients_from_qb(db, user.tenant_id)
+    if not get_valid_connection(db, user.tenant_id):
+        raise HTTPException(400, detail="QuickBooks not connected")
+    try:
+        clients = sync_clients_from_qb(db, user.tenant_id)
+    except QBQueryIncomplete as e:
+        raise HTTPException(502, detail=str(e))
     return {"synced": len(clients)}
@@ -3,6 +3,7 @@ import hashlib
 import secrets
 from datetime import datetime, timedelta, timezone
 from fastapi import Response
+from sqlalchemy import delete, update
 from sqlalchemy.orm import Session
 
 from app.config import get_settings
@@ -39,14 +40,17 @@ def clear_refresh_cookie(response: Response) -> None:
     )
 
 
+def _refresh_expiry() -> datetime:
+    return datetime.now(timezone.utc) + timedelta(days=settings.refresh_cookie_max_age_days)
+
+
 def create_and_store_refresh_token(db: Session, user_id: str) -> str:
     """Create opaque token, store hash in DB, return raw token for cookie."""
     token = create_opaque_refresh_token()
-    expires_at = datetime.now(timezone.utc) + timedelta(days=settings.refresh_cookie_max_age_days)
     row = RefreshToken(
         user_id=user_id,
         token_hash=hash_token(token),
-        expires_at=expires_at,
+        expires_at=_refresh_expiry(),
     )
     db.add(row)
     db.commit()
@@ -55,18 +59,56 @@ def create_and_store_refresh_token(db: Session, user_id: str) -> str:
 
 def consume_refresh_token(db: Session, token: str) -> tuple[str, str] | None:
     """
-    Validate token, delete it (rotate), create new token and row.
+    Validate token and rotate it: the row's hash and expiry are replaced in place by one
+    UPDATE, committed once. The UPDATE re-checks the old hash, so two concurrent refreshes
+    with the same cookie can't both succeed.
     Returns (new_token, user_id) or None if invalid/expired. Caller should clear cookie and 401.
     """
     token_hash = hash_token(token)
-    row = db.query(RefreshToken).filter(
+    new_token = create_opaque_refresh_token()
+    valid = (
         RefreshToken.token_hash == token_hash,
         RefreshToken.expires_at > datetime.now(timezone.utc),
-    ).first()
-    if not row:
-        return None
-    user_id = row.user_id
-    db.delete(row)
+    )
+    stmt = (
+        update(RefreshToken)
+        .where(*valid)
+        .values(token_hash=hash_token(new_token), expires_at=_refresh_expiry())
+        .execution_options(synchronize_session=False)
+    )
+    if db.get_bind().dialect.update_returning:
+        user_id = db.execute(stmt.returning(RefreshToken.user_id)).scalar()
+    else:
+        row = db.query(RefreshToken.id, RefreshToken.user_id).filter(*valid).with_for_update().first()
+        user_id = row.user_id if row and db.execute(stmt.where(RefreshToken.id == row.id)).rowcount else None
     db.commit()
-    new_token = create_and_store_refresh_token(db, user_id)
+    if user_id is None:
+        return None
     return (new_token, user_id)
+
+
+def purge_expired_refresh_tokens(db: Session, batch_size: int | None = None) -> int:
+    """Delete expired refresh tokens, batch_size rows per DELETE and commit. Returns rows deleted."""
+    batch_size = max(settings.refresh_token_purge_batch_size if batch_size is None else batch_size, 1)
+    deleted = 0
+    while True:
+        now = datetime.now(timezone.utc)
+        ids = [
+            r.id
+            for r in db.query(RefreshToken.id)
+            .filter(RefreshToken.expires_at <= now)
+            .limit(batch_size)
+            .all()
+        ]
+        if not ids:
+            break
+        n = db.execute(
+            delete(RefreshToken)
+            .where(RefreshToken.id.in_(ids), RefreshToken.expires_at <= now)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.commit()
+        deleted += n
+        if len(ids) < batch_size:
+            break
+    return deleted
@@ -3,7 +3,8 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials, OAuth2Pas
 from sqlalchemy.orm import Session
 from app.db import get_db
 from app.auth.jwt import decode_token
-from app.models.tenant import User
+from app.auth.user_cache import user_cache
+from app.models.tenant import Tenant, User
 
 security = HTTPBearer(auto_error=False)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login", auto_error=False)
@@ -20,6 +21,23 @@ def get_current_user_id(
     return payload.get("sub")
 
 
+def _load_active_user(db: Session, user_id: str) -> User | None:
+    """Active user of an active tenant, served from user_cache when fresh."""
+    user = user_cache.get(db, user_id)
+    if user is not None:
+        return user
+    generation = user_cache.generation()
+    user = (
+        db.query(User)
+        .join(Tenant, Tenant.id == User.tenant_id)
+        .filter(User.id == user_id, User.is_active, Tenant.is_active)
+        .first()
+    )
+    if user is not None:
+        user_cache.put(user, generation)
+    return user
+
+
 def get_current_user(
     db: Session = Depends(get_db),
     user_id: str | None = Depends(get_current_user_id),
@@ -30,7 +48,7 @@ def get_current_user(
             detail="Not authenticated",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    user = db.query(User).filter(User.id == user_id, User.is_active).first()
+    user = _load_active_user(db, user_id)
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
     return user
@@ -42,4 +60,4 @@ def get_optional_user(
 ) -> User | None:
     if not user_id:
         return None
-    return db.query(User).filter(User.id == user_id, User.is_active).first()
+    return _load_active_user(db, user_id)
@@ -1,9 +1,19 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
 from jose import JWTError, jwt
 from app.config import get_settings
 
 settings = get_settings()
 
+# sha256(token) -> (exp, claims) for tokens that already passed verification. A token is
+# immutable, so its claims stay valid until exp; raw tokens are never kept in memory.
+_verified: OrderedDict[bytes, tuple[float, dict]] = OrderedDict()
+_verified_lock = threading.Lock()
+_token_stats = {"hits": 0, "misses": 0}
+
 
 def create_access_token(data: dict) -> str:
     to_encode = data.copy()
@@ -12,9 +22,48 @@ def create_access_token(data: dict) -> str:
     return jwt.encode(to_encode, settings.secret_key, algorithm=settings.jwt_algorithm)
 
 
-def decode_token(token: str) -> dict | None:
+def _decode(token: str) -> dict | None:
     try:
         payload = jwt.decode(token, settings.secret_key, algorithms=[settings.jwt_algorithm])
         return payload
     except JWTError:
         return None
+
+
+def decode_token(token: str) -> dict | None:
+    """Verified claims, or None. Repeat tokens are served from the verified-token cache until exp."""
+    key = hashlib.sha256(token.encode()).digest()
+    now = time.time()
+    with _verified_lock:
+        entry = _verified.get(key)
+        if entry is not None and entry[0] > now:
+            _verified.move_to_end(key)
+            _token_stats["hits"] += 1
+            return dict(entry[1])
+        if entry is not None:
+            del _verified[key]
+        _token_stats["misses"] += 1
+    payload = _decode(token)
+    exp = payload.get("exp") if payload else None
+    if isinstance(exp, (int, float)) and exp > now:
+        with _verified_lock:
+            _verified[key] = (float(exp), dict(payload))
+            while len(_verified) > settings.jwt_cache_max_entries:
+                _verified.popitem(last=False)
+    return payload
+
+
+def clear_token_cache() -> None:
+    """Drop cached verifications (e.g. after rotating secret_key in-process)."""
+    with _verified_lock:
+        _verified.clear()
+
+
+def token_cache_stats() -> dict:
+    with _verified_lock:
+        total = _token_stats["hits"] + _token_stats["misses"]
+        return {
+            "size": len(_verified),
+            **_token_stats,
+            "hit_rate": round(_token_stats["hits"] / total, 4) if total else 0.0,
+        }
@@ -1,11 +1,108 @@
+"""
+bcrypt hashing on a dedicated, size-limited process pool so login bursts don't tie up the
+request threadpool (or the GIL). When more than workers + queue calls are in flight, callers
+get 503 instead of waiting. If a worker dies, the pool is replaced and the call retried once.
+"""
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from fastapi import HTTPException, status
 from passlib.context import CryptContext
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from app.config import get_settings
 
+settings = get_settings()
+logger = logging.getLogger(__name__)
 
-def hash_password(password: str) -> str:
+# min/max pinned to the configured cost: hashes with any other cost "need update" and are
+# rehashed on the next successful login
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=settings.bcrypt_rounds,
+    bcrypt__min_rounds=settings.bcrypt_rounds,
+    bcrypt__max_rounds=settings.bcrypt_rounds,
+)
+
+_pool: ProcessPoolExecutor | None = None
+_pool_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(max(settings.password_hash_workers, 1) + max(settings.password_hash_queue, 0))
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: the API process runs threads (scheduler, agent runs) that fork would copy mid-flight
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.password_hash_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def _discard_pool(broken: ProcessPoolExecutor) -> None:
+    """Drop a broken pool so the next _get_pool starts a new one (unless another caller already did)."""
+    global _pool
+    with _pool_lock:
+        if _pool is broken:
+            _pool = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def _run(fn, *args):
+    """Run fn on the pool (inline when password_hash_workers is 0); 503 when the queue is full."""
+    if settings.password_hash_workers <= 0:
+        return fn(*args)
+    if not _slots.acquire(blocking=False):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many concurrent sign-ins, please retry",
+            headers={"Retry-After": "1"},
+        )
+    try:
+        pool = _get_pool()
+        try:
+            return pool.submit(fn, *args).result()
+        except BrokenProcessPool:
+            # A worker died (OOM kill, segfault); the pool fails every later call until replaced
+            logger.warning("Password hashing worker died; restarting the pool")
+            _discard_pool(pool)
+            return _get_pool().submit(fn, *args).result()
+    finally:
+        _slots.release()
+
+
+def _hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
-def verify_password(plain: str, hashed: str) -> bool:
+def _verify(plain: str, hashed: str) -> bool:
     return pwd_context.verify(plain, hashed)
+
+
+def _verify_and_update(plain: str, hashed: str) -> tuple[bool, str | None]:
+    return pwd_context.verify_and_update(plain, hashed)
+
+
+def hash_password(password: str) -> str:
+    return _run(_hash, password)
+
+
+def verify_password(plain: str, hashed: str) -> bool:
+    return _run(_verify, plain, hashed)
+
+
+def verify_and_update_password(plain: str, hashed: str) -> tuple[bool, str | None]:
+    """(valid, new_hash): new_hash is set when the stored hash's cost differs from bcrypt_rounds."""
+    return _run(_verify_and_update, plain, hashed)
+
+
+def shutdown_password_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
@@ -0,0 +1,133 @@
+"""
+Short-TTL, in-process cache of active users for get_current_user, so authenticated requests
+don't each pay a User lookup. Entries are dropped when a user's or tenant's is_active changes
+through the ORM, both when it is set and again once it is committed (a request that reloaded
+the row in between would otherwise cache the old value); the TTL bounds staleness for anything
+else (bulk UPDATEs, other processes).
+"""
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached, object_session
+
+from app.config import get_settings
+from app.models.tenant import Tenant, User
+
+settings = get_settings()
+
+# Set while a cached user is rebuilt and merged into a session: both assign is_active, which
+# must not count as a change
+_merging = threading.local()
+
+
+class UserCache:
+    """LRU of user_id -> (expires, tenant_id, column values)."""
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max(max_entries, 1)
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, tuple[float, str, dict]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0  # bumped by every invalidation
+
+    def get(self, db: Session, user_id: str) -> User | None:
+        """Cached user attached to db without a query, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[user_id]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            values = entry[2]
+        _merging.active = True
+        try:
+            user = User(**values)
+            make_transient_to_detached(user)
+            return db.merge(user, load=False)
+        finally:
+            _merging.active = False
+
+    def generation(self) -> int:
+        """Read before loading a user from the database; pass to put."""
+        with self._lock:
+            return self._generation
+
+    def put(self, user: User, generation: int | None = None) -> None:
+        """Cache user, unless something was invalidated since `generation` (the row may be stale)."""
+        values = {attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs}
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._entries[user.id] = (time.monotonic() + self.ttl_seconds, user.tenant_id, values)
+            self._entries.move_to_end(user.id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: str) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(user_id, None)
+
+    def invalidate_tenant(self, tenant_id: str) -> None:
+        with self._lock:
+            self._generation += 1
+            for user_id in [k for k, e in self._entries.items() if e[1] == tenant_id]:
+                del self._entries[user_id]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+user_cache = UserCache(settings.user_cache_ttl_seconds, settings.user_cache_max_entries)
+
+
+_PENDING_KEY = "user_cache_invalidations"
+
+
+def _invalidate_now_and_on_commit(target, kind: str) -> None:
+    invalidate = user_cache.invalidate if kind == "user" else user_cache.invalidate_tenant
+    invalidate(target.id)
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(_PENDING_KEY, set()).add((kind, target.id))
+
+
+@event.listens_for(User.is_active, "set")
+def _user_active_changed(target: User, value, oldvalue, initiator) -> None:
+    if target.id and not getattr(_merging, "active", False):
+        _invalidate_now_and_on_commit(target, "user")
+
+
+@event.listens_for(Tenant.is_active, "set")
+def _tenant_active_changed(target: Tenant, value, oldvalue, initiator) -> None:
+    if target.id and not getattr(_merging, "active", False):
+        _invalidate_now_and_on_commit(target, "tenant")
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session: Session) -> None:
+    for kind, key in session.info.pop(_PENDING_KEY, ()):
+        (user_cache.invalidate if kind == "user" else user_cache.invalidate_tenant)(key)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_rolled_back(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
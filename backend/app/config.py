@@ -10,12 +10,19 @@ class Settings(BaseSettings):
 
     # Database (multi-tenant: one DB, tenant_id on tables)
     database_url: str = "sqlite:///./app.db"
+    db_write_batch_size: int = 500  # rows per bulk INSERT/UPDATE in agent runs
 
     # Auth: short-lived access token, refresh in HttpOnly cookie with DB rotation
     jwt_algorithm: str = "HS256"
     jwt_expire_minutes: int = 15  # short-lived access token
+    jwt_cache_max_entries: int = 10000  # verified access tokens kept in process
+    bcrypt_rounds: int = 12  # changing it rehashes each password on its next login
+    password_hash_workers: int = 2  # bcrypt process pool size (0 = hash inline)
+    password_hash_queue: int = 16  # calls allowed to wait for a worker before 503
     refresh_cookie_name: str = "refresh_token"
     refresh_cookie_max_age_days: int = 7
+    refresh_token_purge_interval_hours: int = 6  # expired refresh tokens deleted by the scheduler
+    refresh_token_purge_batch_size: int = 1000  # rows per DELETE (one short transaction each)
     cookie_secure: bool = False  # set True in production (HTTPS)
     cookie_same_site: str = "lax"
 
@@ -24,9 +31,61 @@ class Settings(BaseSettings):
     qb_client_secret: str = ""
     qb_redirect_uri: str = "http://localhost:8000/api/qb/callback"
     qb_environment: str = "sandbox"  # sandbox | production
+    qb_page_size: int = 1000  # rows per QuickBooks query page (max 1000)
+    qb_cdc_max_age_days: int = 30  # QB CDC only looks back 30 days; older watermarks force a full sweep
+    qb_http_pool_size: int = 20  # keep-alive connections per process
+    qb_rate_limit_per_minute: int = 500  # Intuit per-realm request quota
+    qb_max_concurrent_per_realm: int = 10  # Intuit per-realm concurrent request limit
+    qb_max_retries: int = 4  # retries for 429 / transient 5xx / connection errors
+    qb_backoff_base_seconds: float = 1.0
+    qb_async_sweep: bool = True  # fetch invoice pages concurrently (httpx) in full agent runs
 
     # OpenAI (for Agno agent)
     openai_api_key: str = ""
+    agent_draft_concurrency: int = 4  # max LLM drafts in flight per agent run
+    agent_draft_batch_size: int = 5  # clients drafted per LLM request (1 = one request per client)
+    draft_routing: str = "auto"  # auto: templates for simple changes, LLM otherwise | llm: always LLM
+    template_max_events: int = 2  # most same-type invoice events a template draft covers
+    agent_run_workers: int = 2  # background agent runs executing at once (in-process queue)
+    agent_run_timeout_minutes: int = 60  # queued/running runs with no heartbeat for this long are considered dead
+    draft_cache_backend: str = "memory"  # memory | db (shared across processes) | none
+    draft_cache_ttl_seconds: int = 86400
+    draft_cache_max_entries: int = 5000
+
+    # Scheduled agent runs (APScheduler). Tenants are sharded by id across scheduler_shards
+    # processes; each process sets its own scheduler_shard_index. Exactly one process may run
+    # each shard: leave scheduler_enabled off on an API started with several workers.
+    scheduler_enabled: bool = False
+    agent_interval_minutes: int = 60  # default per-tenant interval (Tenant.agent_interval_minutes overrides)
+    scheduler_jitter_seconds: int = 300  # random delay per run so tenants don't fire together
+    scheduler_refresh_minutes: int = 5  # how often tenant jobs are reconciled with the DB
+    scheduler_shards: int = 1
+    scheduler_shard_index: int = 0
+
+    # get_current_user cache (per process)
+    user_cache_ttl_seconds: float = 5.0
+    user_cache_max_entries: int = 10000
+
+    # Outgoing email (outbox dispatcher runs in the scheduler; disabled until smtp_host and a
+    # sender are set)
+    smtp_host: str = ""
+    smtp_port: int = 587
+    smtp_username: str = ""
+    smtp_password: str = ""
+    smtp_use_tls: bool = True  # STARTTLS
+    smtp_from: str = ""  # sender address; smtp_username is used when this is empty and it is an address
+    smtp_timeout_seconds: int = 30
+    email_batch_size: int = 50  # outbox rows claimed per batch
+    email_concurrency: int = 4  # SMTP connections / parallel sends per process
+    email_max_attempts: int = 5
+    email_backoff_base_seconds: float = 30.0
+    email_rate_limit_per_minute: int = 60  # per tenant, per dispatcher process
+    email_poll_seconds: int = 10
+
+    # ClientSnapshot history retention (current state lives in client_current_snapshots)
+    snapshot_history_max_age_days: int = 90
+    snapshot_history_keep: int = 10  # newest rows kept per (client, snapshot type)
+    snapshot_prune_interval_hours: int = 24
 
     class Config:
         env_file = ".env"
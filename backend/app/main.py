@@ -1,17 +1,35 @@
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
-from app.db import engine, Base
+from app.db import engine, Base, SessionLocal
 from app.api import auth, quickbooks, clients, pending_updates, agent_run
 import app.models  # noqa: F401 - ensure all models (including RefreshToken) are registered
+from app.config import get_settings
+from app.auth.deps import get_current_user
+from app.auth.jwt import token_cache_stats
+from app.auth.password import shutdown_password_pool
+from app.auth.user_cache import user_cache
+from app.services.agent_run_service import fail_stale_runs, shutdown_agent_runs
+from app.services.scheduler_service import build_scheduler
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        fail_stale_runs(db)
+    finally:
+        db.close()
+    scheduler = build_scheduler() if get_settings().scheduler_enabled else None
+    if scheduler:
+        scheduler.start()
     yield
-    # shutdown if needed
+    if scheduler:
+        scheduler.shutdown(wait=False)
+    shutdown_agent_runs()
+    shutdown_password_pool()
 
 
 app = FastAPI(
@@ -25,6 +43,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 app.include_router(auth.router)
@@ -37,3 +56,9 @@ app.include_router(agent_run.router)
 @app.get("/health")
 def health():
     return {"status": "ok"}
+
+
+@app.get("/health/caches", dependencies=[Depends(get_current_user)])
+def cache_stats():
+    """Hit/miss counters of in-process caches (authenticated: they reflect every tenant's traffic)."""
+    return {"users": user_cache.stats(), "tokens": token_cache_stats()}
@@ -1,7 +1,10 @@
 from app.models.tenant import Tenant, User
 from app.models.quickbooks import QuickBooksConnection
-from app.models.client import Client, ClientSnapshot, PendingUpdate, UpdateHistory
+from app.models.client import Client, ClientSnapshot, ClientCurrentSnapshot, PendingUpdate, UpdateHistory
 from app.models.refresh_token import RefreshToken
+from app.models.agent_run import AgentRun
+from app.models.draft_cache import DraftCacheEntry
+from app.models.email_outbox import EmailOutbox
 
 __all__ = [
     "Tenant",
@@ -9,7 +12,11 @@ __all__ = [
     "QuickBooksConnection",
     "Client",
     "ClientSnapshot",
+    "ClientCurrentSnapshot",
     "PendingUpdate",
     "UpdateHistory",
     "RefreshToken",
+    "AgentRun",
+    "DraftCacheEntry",
+    "EmailOutbox",
 ]
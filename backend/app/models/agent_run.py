@@ -0,0 +1,35 @@
+"""Background agent runs: queued by POST /api/agent/run, polled by id for progress."""
+from sqlalchemy import Column, String, DateTime, ForeignKey, Text, Integer, Index, text
+from sqlalchemy.sql import func
+from app.db import Base
+import uuid
+
+
+def uuid_str():
+    return str(uuid.uuid4())
+
+
+class AgentRun(Base):
+    __tablename__ = "agent_runs"
+    __table_args__ = (
+        # At most one queued/running run per tenant, however many processes enqueue
+        Index(
+            "uq_agent_runs_tenant_active",
+            "tenant_id",
+            unique=True,
+            postgresql_where=text("status IN ('queued', 'running')"),
+            sqlite_where=text("status IN ('queued', 'running')"),
+        ),
+    )
+
+    id = Column(String(36), primary_key=True, default=uuid_str)
+    tenant_id = Column(String(36), ForeignKey("tenants.id"), nullable=False, index=True)
+    status = Column(String(32), default="queued")  # queued | running | succeeded | failed
+    clients_total = Column(Integer, default=0)
+    clients_processed = Column(Integer, default=0)
+    created_update_ids = Column(Text, nullable=True)  # JSON list of PendingUpdate ids
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())  # last heartbeat or progress write
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, ForeignKey, Text, Integer
+from sqlalchemy import Column, String, DateTime, ForeignKey, Text, Integer, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.db import Base
@@ -12,6 +12,10 @@ def uuid_str():
 class Client(Base):
     """Client/customer per tenant; maps to QuickBooks Customer + optional contact email."""
     __tablename__ = "clients"
+    __table_args__ = (
+        # Upsert target for sync_clients_from_qb (INSERT ... ON CONFLICT)
+        UniqueConstraint("tenant_id", "qb_customer_id", name="uq_clients_tenant_qb_customer"),
+    )
 
     id = Column(String(36), primary_key=True, default=uuid_str)
     tenant_id = Column(String(36), ForeignKey("tenants.id"), nullable=False, index=True)
@@ -41,9 +45,25 @@ class ClientSnapshot(Base):
     client = relationship("Client", back_populates="snapshots")
 
 
+class ClientCurrentSnapshot(Base):
+    """Latest state per (client, snapshot type), upserted in place; ClientSnapshot keeps history."""
+    __tablename__ = "client_current_snapshots"
+
+    client_id = Column(String(36), ForeignKey("clients.id"), primary_key=True)
+    snapshot_type = Column(String(32), primary_key=True)
+    payload = Column(Text, nullable=False)  # JSON
+    content_hash = Column(String(64), nullable=False)  # sha256 of canonical JSON
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
 class PendingUpdate(Base):
     """Agent-drafted email update; buyer can approve (send), edit, or delete."""
     __tablename__ = "pending_updates"
+    __table_args__ = (
+        # Keyset pagination of GET /api/pending-updates (newest first), with and without a status filter
+        Index("ix_pending_updates_tenant_status_created", "tenant_id", "status", "created_at", "id"),
+        Index("ix_pending_updates_tenant_created", "tenant_id", "created_at", "id"),
+    )
 
     id = Column(String(36), primary_key=True, default=uuid_str)
     tenant_id = Column(String(36), ForeignKey("tenants.id"), nullable=False, index=True)
@@ -52,6 +72,7 @@ class PendingUpdate(Base):
     body_html = Column(Text, nullable=False)
     body_plain = Column(Text, nullable=True)
     change_summary = Column(Text, nullable=True)  # what changed (for buyer context)
+    draft_source = Column(String(16), nullable=True)  # template | llm
     status = Column(String(32), default="pending")  # pending | approved | rejected | sent
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
@@ -0,0 +1,14 @@
+"""Drafted updates cached by prompt hash (DB backend of app.agents.draft_cache)."""
+from sqlalchemy import Column, String, DateTime, Text
+from sqlalchemy.sql import func
+from app.db import Base
+
+
+class DraftCacheEntry(Base):
+    __tablename__ = "draft_cache"
+
+    key = Column(String(64), primary_key=True)  # sha256 of normalized prompt inputs
+    payload = Column(Text, nullable=False)  # JSON {subject, body_plain, body_html}
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    last_used_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -0,0 +1,32 @@
+"""Outgoing emails, written in the same transaction as the status change and sent by the dispatcher."""
+from sqlalchemy import Column, String, DateTime, ForeignKey, Text, Integer, Index
+from sqlalchemy.sql import func
+from app.db import Base
+import uuid
+
+
+def uuid_str():
+    return str(uuid.uuid4())
+
+
+class EmailOutbox(Base):
+    __tablename__ = "email_outbox"
+    __table_args__ = (
+        # Dispatcher claim query: due rows by next_attempt_at
+        Index("ix_email_outbox_status_next_attempt", "status", "next_attempt_at"),
+    )
+
+    id = Column(String(36), primary_key=True, default=uuid_str)
+    tenant_id = Column(String(36), ForeignKey("tenants.id"), nullable=False, index=True)
+    pending_update_id = Column(String(36), ForeignKey("pending_updates.id"), nullable=True, index=True)
+    to_address = Column(String(255), nullable=True)
+    subject = Column(String(512), nullable=False)
+    body_html = Column(Text, nullable=False)
+    body_plain = Column(Text, nullable=True)
+    status = Column(String(32), default="queued")  # queued | sending | sent | failed
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime(timezone=True), server_default=func.now())  # lease expiry while sending
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    sent_at = Column(DateTime(timezone=True), nullable=True)
+    latency_ms = Column(Integer, nullable=True)  # created_at -> accepted by the SMTP server
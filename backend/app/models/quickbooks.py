@@ -19,6 +19,7 @@ class QuickBooksConnection(Base):
     access_token = Column(Text, nullable=False)
     refresh_token = Column(Text, nullable=False)
     token_expires_at = Column(DateTime(timezone=True), nullable=False)
+    last_synced_at = Column(DateTime(timezone=True), nullable=True)  # CDC watermark for incremental runs
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
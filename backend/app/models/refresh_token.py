@@ -15,5 +15,5 @@ class RefreshToken(Base):
     id = Column(String(36), primary_key=True, default=uuid_str)
     user_id = Column(String(36), ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
     token_hash = Column(String(64), nullable=False, unique=True, index=True)  # sha256 hex
-    expires_at = Column(DateTime(timezone=True), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)  # purge scans by expiry
     created_at = Column(DateTime(timezone=True), server_default=func.now())
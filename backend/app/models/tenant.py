@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Boolean, DateTime, ForeignKey
+from sqlalchemy import Column, String, Boolean, DateTime, ForeignKey, Integer
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.db import Base
@@ -17,6 +17,8 @@ class Tenant(Base):
     name = Column(String(255), nullable=False)
     slug = Column(String(64), unique=True, nullable=False, index=True)
     is_active = Column(Boolean, default=True)
+    agent_interval_minutes = Column(Integer, nullable=True)  # scheduled run interval override
+    draft_routing = Column(String(16), nullable=True)  # auto | llm; null = settings.draft_routing
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
@@ -0,0 +1,15 @@
+from pydantic import BaseModel
+from datetime import datetime
+
+
+class AgentRunOut(BaseModel):
+    id: str
+    tenant_id: str
+    status: str
+    clients_total: int
+    clients_processed: int
+    created_update_ids: list[str] = []
+    error: str | None = None
+    created_at: datetime | None
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
 
 
@@ -7,9 +7,10 @@ class PendingUpdateOut(BaseModel):
     tenant_id: str
     client_id: str
     subject: str
-    body_html: str
+    body_html: str | None  # None in the list's include_body=false mode
     body_plain: str | None
     change_summary: str | None
+    draft_source: str | None = None
     status: str
     created_at: datetime | None
     client_display_name: str | None = None
@@ -23,3 +24,19 @@ class PendingUpdateEdit(BaseModel):
     subject: str | None = None
     body_html: str | None = None
     body_plain: str | None = None
+
+
+class PendingUpdateBulk(BaseModel):
+    ids: list[str] = Field(min_length=1, max_length=500)
+
+
+class BulkItemResult(BaseModel):
+    id: str
+    ok: bool
+    detail: str | None = None
+
+
+class BulkResultOut(BaseModel):
+    succeeded: int
+    failed: int
+    results: list[BulkItemResult]  # one per requested id, in request order
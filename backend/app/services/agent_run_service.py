@@ -0,0 +1,220 @@
+"""
+Background agent runs: POST /api/agent/run enqueues an AgentRun row and returns immediately;
+an in-process worker pool executes run_agent_for_tenant and records progress on the row.
+A listener can also be attached at enqueue time to receive run events as they happen
+(used by the streaming endpoint). While a process holds queued or running runs it refreshes
+their updated_at, so a run is only considered dead once its process stops heartbeating.
+"""
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from datetime import datetime, timedelta, timezone
+from typing import Callable
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.db import SessionLocal
+from app.models.agent_run import AgentRun
+from app.models.client import PendingUpdate
+from app.schemas.pending_update import PendingUpdateOut
+from app.services.agent_service import RunProgress, run_agent_for_tenant
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ("queued", "running")
+
+_executor = ThreadPoolExecutor(max_workers=settings.agent_run_workers, thread_name_prefix="agent-run")
+
+# Runs queued or running in this process; _heartbeat_loop keeps their updated_at fresh
+_local_runs: set[str] = set()
+_local_lock = threading.Lock()
+_heartbeat: threading.Thread | None = None
+
+# Rows written before updated_at existed fall back to created_at
+_last_activity = func.coalesce(AgentRun.updated_at, AgentRun.created_at)
+
+
+def _stale_before() -> datetime:
+    return datetime.now(timezone.utc) - timedelta(minutes=settings.agent_run_timeout_minutes)
+
+
+def _heartbeat_loop() -> None:
+    global _heartbeat
+    interval = max(settings.agent_run_timeout_minutes * 60 / 4, 1.0)
+    while True:
+        time.sleep(interval)
+        with _local_lock:
+            run_ids = list(_local_runs)
+            if not run_ids:
+                _heartbeat = None
+                return
+        db = SessionLocal()
+        try:
+            db.query(AgentRun).filter(AgentRun.id.in_(run_ids), AgentRun.status.in_(ACTIVE_STATUSES)).update(
+                {"updated_at": datetime.now(timezone.utc)}, synchronize_session=False
+            )
+            db.commit()
+        except Exception:
+            logger.exception("Agent run heartbeat failed")
+        finally:
+            db.close()
+
+
+def _track(run_id: str) -> None:
+    global _heartbeat
+    with _local_lock:
+        _local_runs.add(run_id)
+        if _heartbeat is None:
+            _heartbeat = threading.Thread(target=_heartbeat_loop, name="agent-run-heartbeat", daemon=True)
+            _heartbeat.start()
+
+
+def _untrack(run_id: str) -> None:
+    with _local_lock:
+        _local_runs.discard(run_id)
+
+
+def get_active_run(db: Session, tenant_id: str) -> AgentRun | None:
+    """Queued/running run for the tenant; runs with no heartbeat within the timeout are treated as dead."""
+    return (
+        db.query(AgentRun)
+        .filter(
+            AgentRun.tenant_id == tenant_id,
+            AgentRun.status.in_(ACTIVE_STATUSES),
+            _last_activity >= _stale_before(),
+        )
+        .first()
+    )
+
+
+def enqueue_agent_run(
+    db: Session,
+    tenant_id: str,
+    listener: Callable[[dict], None] | None = None,
+) -> AgentRun:
+    """
+    Queue a run for the tenant, or return the one already queued/running (the listener is
+    only attached to a newly queued run). uq_agent_runs_tenant_active makes this safe across
+    processes: the losing insert returns the winner's run.
+    """
+    existing = get_active_run(db, tenant_id)
+    if existing:
+        return existing
+    # A dead run still holds the tenant's active slot in the unique index
+    fail_stale_runs(db, tenant_id)
+    run = AgentRun(tenant_id=tenant_id, status="queued")
+    db.add(run)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        existing = get_active_run(db, tenant_id)
+        if existing:
+            return existing
+        raise
+    db.refresh(run)
+    _track(run.id)
+    _executor.submit(execute_agent_run, run.id, listener)
+    return run
+
+
+def _update_run(run_id: str, expect: tuple[str, ...] = ("running",), **fields) -> bool:
+    """
+    Write run fields on a short-lived session so progress never commits the run's own work.
+    Only applies while the run's status is in expect, so a run already failed as stale is
+    never overwritten. Returns whether the row was updated.
+    """
+    db = SessionLocal()
+    try:
+        n = (
+            db.query(AgentRun)
+            .filter(AgentRun.id == run_id, AgentRun.status.in_(expect))
+            .update({**fields, "updated_at": datetime.now(timezone.utc)}, synchronize_session=False)
+        )
+        db.commit()
+        return n > 0
+    finally:
+        db.close()
+
+
+def pending_update_event(pending: PendingUpdate) -> dict:
+    out = PendingUpdateOut.model_validate(pending)
+    if pending.client:
+        out.client_display_name = pending.client.display_name
+        out.client_email = pending.client.email
+    return {"event": "update", "update": out.model_dump(mode="json")}
+
+
+def execute_agent_run(run_id: str, listener: Callable[[dict], None] | None = None) -> None:
+    """
+    Run a queued AgentRun. listener, if given, receives status, progress, update (one per
+    committed PendingUpdate) and finally done or error events, as JSON-serializable dicts.
+    """
+    emit = listener or (lambda event: None)
+    db = SessionLocal()
+    try:
+        run = db.get(AgentRun, run_id)
+        if not run or not _update_run(
+            run_id, expect=("queued",), status="running", started_at=datetime.now(timezone.utc)
+        ):
+            emit({"event": "error", "run_id": run_id, "detail": "Run is not queued"})
+            return
+        tenant_id = run.tenant_id
+        emit({"event": "status", "run_id": run_id, "status": "running"})
+
+        def progress(p: RunProgress) -> None:
+            # Progress is advisory: a write that fails (e.g. database is locked) must not fail the run
+            try:
+                _update_run(run_id, clients_processed=p.clients_processed, clients_total=p.clients_total)
+            except SQLAlchemyError:
+                logger.warning("Agent run %s: progress update skipped", run_id, exc_info=True)
+            emit({"event": "progress", "run_id": run_id, **asdict(p)})
+
+        on_update = (lambda pending: emit(pending_update_event(pending))) if listener else None
+        created = run_agent_for_tenant(db, tenant_id, progress=progress, on_update=on_update)
+        created_ids = [p.id for p in created]
+        if not _update_run(
+            run_id,
+            status="succeeded",
+            created_update_ids=json.dumps(created_ids),
+            finished_at=datetime.now(timezone.utc),
+        ):
+            logger.warning("Agent run %s finished after it was marked failed", run_id)
+            emit({"event": "error", "run_id": run_id, "detail": "Run was marked failed before it finished"})
+            return
+        emit({"event": "done", "run_id": run_id, "status": "succeeded", "created_update_ids": created_ids})
+    except Exception as e:
+        logger.exception("Agent run %s failed", run_id)
+        db.rollback()
+        _update_run(run_id, status="failed", error=str(e), finished_at=datetime.now(timezone.utc))
+        emit({"event": "error", "run_id": run_id, "detail": str(e)})
+    finally:
+        _untrack(run_id)
+        db.close()
+
+
+def fail_stale_runs(db: Session, tenant_id: str | None = None) -> int:
+    """
+    The queue is in-process: a run whose process died stays queued/running forever.
+    Mark runs (all, or the tenant's) with no heartbeat for agent_run_timeout_minutes as
+    failed. Safe with several processes, unlike failing every active run on startup.
+    """
+    query = db.query(AgentRun).filter(AgentRun.status.in_(ACTIVE_STATUSES), _last_activity < _stale_before())
+    if tenant_id is not None:
+        query = query.filter(AgentRun.tenant_id == tenant_id)
+    n = query.update(
+        {"status": "failed", "error": "Timed out or interrupted", "finished_at": datetime.now(timezone.utc)},
+        synchronize_session=False,
+    )
+    db.commit()
+    return n
+
+
+def shutdown_agent_runs() -> None:
+    _executor.shutdown(wait=False, cancel_futures=True)
@@ -1,21 +1,70 @@
 """
 Orchestrates: sync QB clients, detect changes per client, draft updates via Agno, save pending updates.
 """
+import hashlib
 import json
-from sqlalchemy.orm import Session
-from datetime import datetime, timezone
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, replace
+from typing import Callable
+from sqlalchemy import func, insert, update
+from sqlalchemy.orm import Session, joinedload
+from datetime import datetime, timedelta, timezone
 
-from app.models.client import Client, ClientSnapshot, PendingUpdate, UpdateHistory
+from app.config import get_settings
+from app.models.client import Client, ClientSnapshot, ClientCurrentSnapshot, PendingUpdate, UpdateHistory, uuid_str
 from app.models.tenant import Tenant
 from app.services.quickbooks_service import (
     get_valid_connection,
-    fetch_invoices,
+    iter_invoices,
+    fetch_changes_since,
+    group_invoices_by_customer,
     sync_clients_from_qb,
 )
-from app.agents.update_agent import draft_client_update
+from app.services.quickbooks_async_service import sweep_invoices_by_customer
+from app.agents.update_agent import draft_client_update, draft_client_updates_batch
+from app.agents.draft_cache import get_draft_cache
+from app.agents.templates import render_template_draft
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+def snapshot_hash(payload: dict) -> str:
+    """Stable digest of a snapshot payload (key order independent)."""
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def load_current_snapshots(
+    db: Session,
+    tenant_id: str,
+    snapshot_type: str,
+) -> dict[tuple[str, str], ClientCurrentSnapshot]:
+    """A tenant's current snapshots in one query, keyed by (client_id, snapshot_type)."""
+    rows = (
+        db.query(ClientCurrentSnapshot)
+        .join(Client, Client.id == ClientCurrentSnapshot.client_id)
+        .filter(Client.tenant_id == tenant_id, ClientCurrentSnapshot.snapshot_type == snapshot_type)
+        .all()
+    )
+    return {(r.client_id, r.snapshot_type): r for r in rows}
+
+
+def _parse_payload(payload: str | None) -> dict | None:
+    if not payload:
+        return None
+    try:
+        return json.loads(payload)
+    except json.JSONDecodeError:
+        return None
 
 
 def get_last_snapshot(db: Session, client_id: str, snapshot_type: str) -> dict | None:
+    current = db.get(ClientCurrentSnapshot, (client_id, snapshot_type))
+    if current:
+        return _parse_payload(current.payload)
+    # Clients snapshotted before client_current_snapshots existed
     row = (
         db.query(ClientSnapshot)
         .filter(
@@ -25,130 +74,525 @@ def get_last_snapshot(db: Session, client_id: str, snapshot_type: str) -> dict |
         .order_by(ClientSnapshot.created_at.desc())
         .first()
     )
-    if not row or not row.payload:
-        return None
-    try:
-        return json.loads(row.payload)
-    except json.JSONDecodeError:
-        return None
+    return _parse_payload(row.payload if row else None)
 
 
-def save_snapshot(db: Session, client_id: str, snapshot_type: str, payload: dict) -> ClientSnapshot:
-    snap = ClientSnapshot(
-        client_id=client_id,
-        snapshot_type=snapshot_type,
-        payload=json.dumps(payload),
+def prune_snapshot_history(
+    db: Session,
+    max_age_days: int | None = None,
+    keep: int | None = None,
+) -> int:
+    """
+    Delete ClientSnapshot history older than max_age_days, and beyond the newest `keep` rows
+    per (client, snapshot type). Current state is untouched, and so is the newest history row
+    of a client with no current snapshot yet: get_last_snapshot still reads its state from
+    there. Returns rows deleted.
+    """
+    max_age_days = settings.snapshot_history_max_age_days if max_age_days is None else max_age_days
+    keep = settings.snapshot_history_keep if keep is None else keep
+    cutoff = datetime.now(timezone.utc) - timedelta(days=max_age_days)
+    ranked = (
+        db.query(
+            ClientSnapshot.id,
+            ClientSnapshot.client_id,
+            ClientSnapshot.snapshot_type,
+            func.row_number()
+            .over(
+                partition_by=(ClientSnapshot.client_id, ClientSnapshot.snapshot_type),
+                order_by=ClientSnapshot.created_at.desc(),
+            )
+            .label("rn"),
+        )
+        .subquery()
+    )
+    has_current = (
+        db.query(ClientCurrentSnapshot.client_id)
+        .filter(
+            ClientCurrentSnapshot.client_id == ranked.c.client_id,
+            ClientCurrentSnapshot.snapshot_type == ranked.c.snapshot_type,
+        )
+        .exists()
+    )
+    legacy_latest = db.query(ranked.c.id).filter(ranked.c.rn == 1, ~has_current).scalar_subquery()
+    deleted = (
+        db.query(ClientSnapshot)
+        .filter(ClientSnapshot.created_at < cutoff, ClientSnapshot.id.not_in(legacy_latest))
+        .delete(synchronize_session=False)
+    )
+    excess = db.query(ranked.c.id).filter(ranked.c.rn > keep).scalar_subquery()
+    deleted += (
+        db.query(ClientSnapshot)
+        .filter(ClientSnapshot.id.in_(excess), ClientSnapshot.id.not_in(legacy_latest))
+        .delete(synchronize_session=False)
     )
-    db.add(snap)
     db.commit()
-    db.refresh(snap)
-    return snap
+    return deleted
+
+
+INVOICE_HASH_FIELDS = ("DocNumber", "TotalAmt", "Balance", "TxnDate")
+
+
+def invoice_digest(inv: dict) -> str:
+    """Digest of the fields we diff on; a changed digest means the invoice was updated."""
+    return snapshot_hash({k: inv.get(k) for k in INVOICE_HASH_FIELDS})[:16]
+
+
+def summarize_invoice(inv: dict) -> dict:
+    """The compared fields of one QB invoice, plus their digest."""
+    s = {"Id": inv.get("Id"), **{k: inv.get(k) for k in INVOICE_HASH_FIELDS}}
+    s["Hash"] = invoice_digest(s)
+    return s
 
 
 def invoice_summary_for_comparison(invoices: list[dict]) -> dict:
-    """Normalize invoice list to a comparable summary (ids and key fields)."""
-    return {
-        "count": len(invoices),
-        "invoices": [
-            {
-                "Id": inv.get("Id"),
-                "DocNumber": inv.get("DocNumber"),
-                "TotalAmt": inv.get("TotalAmt"),
-                "Balance": inv.get("Balance"),
-                "TxnDate": inv.get("TxnDate"),
-            }
-            for inv in (invoices or [])
-        ],
-    }
+    """Normalize invoice list to a comparable summary (ids, key fields and their digest)."""
+    summaries = [summarize_invoice(inv) for inv in invoices or []]
+    return {"count": len(summaries), "invoices": summaries}
+
+
+def invoice_sort_key(inv: dict) -> tuple:
+    """QuickBooks Ids in numeric order ("1003" before "1013"); non-numeric Ids after, as text."""
+    inv_id = str(inv.get("Id"))
+    return (0, int(inv_id), "") if inv_id.isdigit() else (1, 0, inv_id)
+
+
+def merge_invoice_summary(previous: dict | None, changed: list[dict]) -> dict:
+    """Apply changed invoice summaries (from CDC) on top of the previous summary, keyed by Id."""
+    by_id = {str(i.get("Id")): i for i in (previous or {}).get("invoices", [])}
+    for i in changed:
+        by_id[str(i.get("Id"))] = i
+    invoices = list(by_id.values())
+    return {"count": len(invoices), "invoices": invoices}
+
+
+def _as_number(v) -> float:
+    try:
+        return float(v or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def classify_invoice_update(before: dict, after: dict) -> str:
+    """paid | partially_paid | voided | updated, from the summary fields alone."""
+    total, balance = _as_number(after.get("TotalAmt")), _as_number(after.get("Balance"))
+    prev_balance = _as_number(before.get("Balance"))
+    if total == 0 and _as_number(before.get("TotalAmt")) != 0:
+        return "voided"  # QuickBooks zeroes amounts on void
+    if balance == 0 and prev_balance > 0:
+        return "paid"
+    if 0 < balance < prev_balance:
+        return "partially_paid"
+    return "updated"
+
+
+def _describe(event: str, inv: dict) -> str:
+    doc = inv.get("DocNumber") or inv.get("Id")
+    amt = inv.get("TotalAmt")
+    if event == "new":
+        return f"New invoice {doc} (amount: {amt})"
+    if event == "paid":
+        return f"Invoice {doc} was paid in full (amount: {amt})"
+    if event == "partially_paid":
+        return f"Payment received on invoice {doc} (remaining balance: {inv.get('Balance')})"
+    if event == "voided":
+        return f"Invoice {doc} was voided"
+    if event == "removed":
+        return f"Invoice {doc} was removed"
+    return f"Invoice {doc} was updated (amount: {amt}, balance: {inv.get('Balance')})"
 
 
 def detect_invoice_changes(previous: dict | None, current: dict) -> dict | None:
-    """If there are new or updated invoices, return a short change summary for the agent."""
-    if not current or not current.get("invoices"):
+    """
+    Diff invoice summaries as Id -> digest maps and classify new, updated (paid, partially
+    paid, voided, other) and removed invoices. Returns a change summary for the agent, or None.
+    current must be complete (a full sweep that read every row, or previous merged with CDC
+    changes): any previous invoice missing from it is reported as removed.
+    """
+    prev_by_id = {str(i.get("Id")): i for i in (previous or {}).get("invoices") or []}
+    cur_invoices = (current or {}).get("invoices") or []
+    if not cur_invoices and not prev_by_id:
         return None
-    prev_ids = set()
-    if previous and previous.get("invoices"):
-        prev_ids = {str(i.get("Id")) for i in previous["invoices"]}
-    cur_invoices = current.get("invoices", [])
-    new_ones = [i for i in cur_invoices if str(i.get("Id")) not in prev_ids]
-    if not new_ones and previous and previous.get("count") == current.get("count"):
+    events: list[dict] = []
+    seen: set[str] = set()
+    for inv in cur_invoices:
+        inv_id = str(inv.get("Id"))
+        seen.add(inv_id)
+        before = prev_by_id.get(inv_id)
+        if before is None:
+            events.append({"type": "new", "invoice": inv})
+        elif (before.get("Hash") or invoice_digest(before)) != (inv.get("Hash") or invoice_digest(inv)):
+            events.append({"type": classify_invoice_update(before, inv), "invoice": inv})
+    for inv_id, before in prev_by_id.items():
+        if inv_id not in seen:
+            events.append({"type": "removed", "invoice": before})
+    if not events:
         return None
-    lines = []
-    if new_ones:
-        for i in new_ones:
-            amt = i.get("TotalAmt")
-            doc = i.get("DocNumber") or i.get("Id")
-            lines.append(f"New invoice {doc} (amount: {amt})")
-    if not lines:
+    return {
+        "summary": "; ".join(_describe(e["type"], e["invoice"]) for e in events),
+        "events": events,
+        "new_invoices": [e["invoice"] for e in events if e["type"] == "new"],
+        "updated_invoices": [e["invoice"] for e in events if e["type"] not in ("new", "removed")],
+        "removed_invoices": [e["invoice"] for e in events if e["type"] == "removed"],
+    }
+
+
+@dataclass
+class DraftJob:
+    """Plain-data input for one LLM draft, safe to hand to a worker thread (no ORM objects)."""
+    client_id: str
+    client_display_name: str
+    client_email: str | None
+    change_summary: str
+    company_context: str
+    snapshot: dict
+    position: int = 0  # the client's index in detect order
+
+
+@dataclass
+class RunProgress:
+    """Counters reported to run_agent_for_tenant's progress callback."""
+    clients_total: int = 0
+    clients_scanned: int = 0
+    changes_found: int = 0
+    drafts_in_flight: int = 0
+    clients_processed: int = 0
+
+
+PROGRESS_EVERY = 100  # clients scanned between progress reports in the detect phase
+
+
+def _draft_or_none(job: DraftJob, check_cache: bool = True) -> dict | None:
+    try:
+        return draft_client_update(
+            client_display_name=job.client_display_name,
+            client_email=job.client_email,
+            change_summary=job.change_summary,
+            company_context=job.company_context,
+            check_cache=check_cache,
+        )
+    except Exception:
+        logger.exception("Draft failed for client %s", job.client_id)
         return None
-    return {"summary": "; ".join(lines), "new_invoices": new_ones}
 
 
-def has_recent_pending_for_client(db: Session, client_id: str) -> bool:
-    """Avoid duplicate pending updates for the same client (e.g. within same run)."""
-    from datetime import timedelta
+def _draft_batch(jobs: list[DraftJob]) -> list[dict | None]:
+    """One LLM request for the batch; items it could not draft fall back to single-client drafts."""
+    if len(jobs) == 1:
+        return [_draft_or_none(jobs[0])]
+    try:
+        drafts = draft_client_updates_batch([
+            {
+                "client_display_name": job.client_display_name,
+                "client_email": job.client_email,
+                "change_summary": job.change_summary,
+                "company_context": job.company_context,
+            }
+            for job in jobs
+        ])
+    except Exception:
+        logger.exception("Batch draft failed for %d clients; drafting individually", len(jobs))
+        return [_draft_or_none(job) for job in jobs]
+    # The batch call already looked every item up in the draft cache
+    return [draft if draft is not None else _draft_or_none(job, check_cache=False) for job, draft in zip(jobs, drafts)]
+
+
+def draft_updates_concurrently(
+    jobs: list[DraftJob],
+    on_batch: Callable[[list[DraftJob], list[dict | None]], None] | None = None,
+) -> list[dict | None]:
+    """
+    Draft in batches of settings.agent_draft_batch_size clients per LLM request, on a bounded
+    thread pool (settings.agent_draft_concurrency).
+    Results are in job order; a failed draft yields None instead of aborting the batch.
+    on_batch(jobs, drafts) is called on the calling thread as each batch finishes.
+    """
+    if not jobs:
+        return []
+    size = max(1, settings.agent_draft_batch_size)
+    batches = [jobs[i:i + size] for i in range(0, len(jobs), size)]
+    workers = max(1, min(settings.agent_draft_concurrency, len(batches)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="draft") as pool:
+        futures = {pool.submit(_draft_batch, batch): batch for batch in batches}
+        if on_batch:
+            for future in as_completed(futures):
+                on_batch(futures[future], future.result())
+        return [draft for future in futures for draft in future.result()]
+
+
+def clients_with_recent_pending(db: Session, tenant_id: str) -> set[str]:
+    """Clients with a pending update from the last 24h (no second draft for them); one query per run."""
     since = datetime.now(timezone.utc) - timedelta(hours=24)
-    exists = (
-        db.query(PendingUpdate)
+    rows = (
+        db.query(PendingUpdate.client_id)
         .filter(
-            PendingUpdate.client_id == client_id,
+            PendingUpdate.tenant_id == tenant_id,
             PendingUpdate.status == "pending",
             PendingUpdate.created_at >= since,
         )
-        .first()
+        .distinct()
+        .all()
     )
-    return exists is not None
+    return {r.client_id for r in rows}
 
 
-def run_agent_for_tenant(db: Session, tenant_id: str) -> list[PendingUpdate]:
+class RunWriter:
+    """
+    Unit of work for an agent run: snapshot and PendingUpdate rows are buffered and written
+    with bulk INSERT/UPDATE statements every batch_size rows, inside the caller's transaction.
+    The caller commits (once at the end, or per draft batch when streaming), unless
+    commit_flushes is set, in which case every flush is committed.
+    """
+
+    def __init__(
+        self,
+        db: Session,
+        current_snapshots: dict[tuple[str, str], ClientCurrentSnapshot] | None = None,
+        batch_size: int | None = None,
+        commit_flushes: bool = False,
+    ):
+        self.db = db
+        self.commit_flushes = commit_flushes
+        # Hashes rather than ORM rows, so a mid-run commit (which expires them) costs no reloads
+        self.current_hashes = (
+            {key: snap.content_hash for key, snap in current_snapshots.items()}
+            if current_snapshots is not None
+            else None
+        )
+        self.batch_size = max(1, batch_size or settings.db_write_batch_size)
+        self.pending_update_ids: list[str] = []
+        self._current_inserts: list[dict] = []
+        self._current_updates: list[dict] = []
+        self._history: list[dict] = []
+        self._pending: list[dict] = []
+
+    def save_snapshot(self, client_id: str, snapshot_type: str, payload: dict) -> None:
+        """Buffer a snapshot: unchanged content writes nothing, otherwise upsert current and append history."""
+        digest = snapshot_hash(payload)
+        key = (client_id, snapshot_type)
+        if self.current_hashes is not None:
+            exists, current_hash = key in self.current_hashes, self.current_hashes.get(key)
+            self.current_hashes[key] = digest
+        else:
+            current = self.db.get(ClientCurrentSnapshot, key)
+            exists, current_hash = current is not None, current.content_hash if current else None
+        if exists and current_hash == digest:
+            return
+        row = {"client_id": client_id, "snapshot_type": snapshot_type, "payload": json.dumps(payload)}
+        (self._current_updates if exists else self._current_inserts).append({**row, "content_hash": digest})
+        self._history.append({"id": uuid_str(), **row})
+        self._maybe_flush()
+
+    def add_pending_update(self, **fields) -> str:
+        pending_id = uuid_str()
+        self._pending.append({"id": pending_id, "status": "pending", **fields})
+        self.pending_update_ids.append(pending_id)
+        self._maybe_flush()
+        return pending_id
+
+    def _maybe_flush(self) -> None:
+        buffered = len(self._current_inserts) + len(self._current_updates) + len(self._history) + len(self._pending)
+        if buffered >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._current_inserts:
+            self.db.execute(insert(ClientCurrentSnapshot), self._current_inserts)
+        if self._current_updates:
+            self.db.execute(update(ClientCurrentSnapshot), self._current_updates)
+        if self._history:
+            self.db.execute(insert(ClientSnapshot), self._history)
+        if self._pending:
+            self.db.execute(insert(PendingUpdate), self._pending)
+        self._current_inserts, self._current_updates, self._history, self._pending = [], [], [], []
+        if self.commit_flushes:
+            # Keep the run's loaded clients and snapshots: nothing here writes through them,
+            # and expiring them would reload each one on next access
+            expire, self.db.expire_on_commit = self.db.expire_on_commit, False
+            try:
+                self.db.commit()
+            finally:
+                self.db.expire_on_commit = expire
+
+    def load_pending_updates(self, ids: list[str] | None = None) -> list[PendingUpdate]:
+        """Created PendingUpdate rows (all, or the given ids) in creation order, with their client, in one query."""
+        ids = self.pending_update_ids if ids is None else ids
+        if not ids:
+            return []
+        rows = (
+            self.db.query(PendingUpdate)
+            .options(joinedload(PendingUpdate.client))
+            .filter(PendingUpdate.id.in_(ids))
+            .all()
+        )
+        by_id = {r.id: r for r in rows}
+        return [by_id[i] for i in ids]
+
+
+def run_agent_for_tenant(
+    db: Session,
+    tenant_id: str,
+    progress: Callable[[RunProgress], None] | None = None,
+    on_update: Callable[[PendingUpdate], None] | None = None,
+) -> list[PendingUpdate]:
     """
     Sync clients from QuickBooks, detect changes per client, draft updates where meaningful.
-    Creates PendingUpdate rows and saves new snapshots. Returns list of created PendingUpdate.
+    Creates PendingUpdate rows and saves new snapshots. Returns list of created PendingUpdate,
+    in client order (on_update, below, sees them in the order they are produced).
+    Runs incrementally (QB CDC since conn.last_synced_at) when the watermark allows it,
+    otherwise does a full sweep; the watermark advances on success.
+    progress(RunProgress) is called at phase boundaries, while scanning, and as draft batches finish.
+    With on_update, updates are committed as they are produced (template drafts after the
+    detect phase, LLM drafts per batch) and on_update(pending_update) is called after each
+    commit; otherwise everything is written in one transaction at the end.
     """
     conn = get_valid_connection(db, tenant_id)
     if not conn:
         return []
 
-    sync_clients_from_qb(db, tenant_id)
-    clients = db.query(Client).filter(Client.tenant_id == tenant_id).all()
-    created: list[PendingUpdate] = []
+    run_started = datetime.now(timezone.utc)
+    changes = fetch_changes_since(db, tenant_id, conn.last_synced_at) if conn.last_synced_at else None
+    incremental = changes is not None
+    if incremental:
+        # Only touch clients whose Customer or Invoice records changed since the watermark
+        sync_clients_from_qb(db, tenant_id, changes["Customer"])
+        invoices_by_customer = group_invoices_by_customer(changes["Invoice"], summarize_invoice)
+        changed_ids = {str(c.get("Id")) for c in changes["Customer"]} | set(invoices_by_customer)
+        clients = (
+            db.query(Client)
+            .filter(Client.tenant_id == tenant_id, Client.qb_customer_id.in_(changed_ids))
+            .all()
+            if changed_ids
+            else []
+        )
+    else:
+        sync_clients_from_qb(db, tenant_id)
+        clients = db.query(Client).filter(Client.tenant_id == tenant_id).all()
+        # One paginated sweep for the whole tenant instead of one QB query per client;
+        # pages are reduced to summaries as they arrive so raw invoice JSON is not retained
+        if settings.qb_async_sweep:
+            invoices_by_customer = sweep_invoices_by_customer(db, tenant_id, summarize_invoice)
+        else:
+            invoices_by_customer = group_invoices_by_customer(iter_invoices(db, tenant_id), summarize_invoice)
+
+    stats = RunProgress(clients_total=len(clients))
 
-    for client in clients:
-        invoices = fetch_invoices(db, tenant_id, client.qb_customer_id)
-        current = invoice_summary_for_comparison(invoices)
-        previous = get_last_snapshot(db, client.id, "invoices")
+    def report() -> None:
+        if progress:
+            progress(replace(stats))
+
+    def publish(ids: list[str]) -> None:
+        writer.flush()
+        db.commit()
+        for pending in writer.load_pending_updates(ids):
+            on_update(pending)
+
+    report()
+    # Detect phase: diff every client on this thread; collect the ones that need a draft.
+    tenant = db.get(Tenant, tenant_id)
+    use_templates = ((tenant.draft_routing if tenant else None) or settings.draft_routing) != "llm"
+    current_snapshots = load_current_snapshots(db, tenant_id, "invoices")
+    recent_pending = clients_with_recent_pending(db, tenant_id)
+    # SQLite allows one writer at a time: an open write transaction here would block the
+    # progress updates the caller makes on its own session until they time out
+    writer = RunWriter(db, current_snapshots, commit_flushes=db.get_bind().dialect.name == "sqlite")
+    jobs: list[DraftJob] = []
+    # (detect position, pending update id): drafts finish out of order, results are returned in client order
+    created: list[tuple[int, str]] = []
+    for position, client in enumerate(clients):
+        stats.clients_scanned += 1
+        if stats.clients_scanned % PROGRESS_EVERY == 0:
+            report()
+        summaries = invoices_by_customer.get(client.qb_customer_id, [])
+        snap = current_snapshots.get((client.id, "invoices"))
+        previous = _parse_payload(snap.payload) if snap else get_last_snapshot(db, client.id, "invoices")
+        if incremental:
+            current = merge_invoice_summary(previous, summaries)
+        else:
+            current = {"count": len(summaries), "invoices": summaries}
+        # Stable order so the snapshot hash only changes when content does
+        current["invoices"].sort(key=invoice_sort_key)
         change = detect_invoice_changes(previous, current)
+        if change:
+            stats.changes_found += 1
 
-        if not change or has_recent_pending_for_client(db, client.id):
+        if not change or client.id in recent_pending:
             # Save snapshot even if no update drafted (for next comparison)
-            save_snapshot(db, client.id, "invoices", current)
+            writer.save_snapshot(client.id, "invoices", current)
+            stats.clients_processed += 1
+            continue
+
+        template = render_template_draft(client.display_name, change["events"]) if use_templates else None
+        if template:
+            # Simple change shape: render directly, no LLM call
+            pending_id = writer.add_pending_update(
+                tenant_id=tenant_id,
+                client_id=client.id,
+                subject=template["subject"],
+                body_html=template["body_html"],
+                body_plain=template["body_plain"],
+                change_summary=change["summary"],
+                draft_source="template",
+            )
+            created.append((position, pending_id))
+            writer.save_snapshot(client.id, "invoices", current)
+            stats.clients_processed += 1
             continue
 
         company_context = ""
         if client.company_name:
             company_context = f"Company: {client.company_name}"
-
-        draft = draft_client_update(
+        jobs.append(DraftJob(
+            client_id=client.id,
             client_display_name=client.display_name,
             client_email=client.email,
             change_summary=change["summary"],
             company_context=company_context,
-        )
+            snapshot=current,
+            position=position,
+        ))
+    template_drafts = len(writer.pending_update_ids)
+    if on_update:
+        publish(list(writer.pending_update_ids))
 
-        pending = PendingUpdate(
-            tenant_id=tenant_id,
-            client_id=client.id,
-            subject=draft["subject"],
-            body_html=draft["body_html"],
-            body_plain=draft.get("body_plain") or draft["body_html"],
-            change_summary=change["summary"],
-            status="pending",
-        )
-        db.add(pending)
-        created.append(pending)
-        save_snapshot(db, client.id, "invoices", current)
+    # Draft phase: LLM calls run concurrently; each batch is written as it completes.
+    def on_batch(batch: list[DraftJob], drafts: list[dict | None]) -> None:
+        ids = []
+        for job, draft in zip(batch, drafts):
+            if draft is None:
+                # Leave the old snapshot so the change is detected again next run
+                continue
+            pending_id = writer.add_pending_update(
+                tenant_id=tenant_id,
+                client_id=job.client_id,
+                subject=draft["subject"],
+                body_html=draft["body_html"],
+                body_plain=draft.get("body_plain") or draft["body_html"],
+                change_summary=job.change_summary,
+                draft_source="llm",
+            )
+            ids.append(pending_id)
+            created.append((job.position, pending_id))
+            writer.save_snapshot(job.client_id, "invoices", job.snapshot)
+        if on_update:
+            publish(ids)
+        stats.drafts_in_flight -= len(batch)
+        stats.clients_processed += len(batch)
+        report()
+
+    stats.drafts_in_flight = len(jobs)
+    report()
+    drafts = draft_updates_concurrently(jobs, on_batch)
+    logger.info(
+        "Tenant %s: %d template drafts, %d LLM drafts; draft cache %s",
+        tenant_id,
+        template_drafts,
+        len(jobs),
+        get_draft_cache().stats(),
+    )
 
+    writer.flush()
+    if all(d is not None for d in drafts):
+        # A failed draft keeps the watermark so the next incremental run revisits its client
+        conn.last_synced_at = run_started
     db.commit()
-    for p in created:
-        db.refresh(p)
-    return created
+    return writer.load_pending_updates([pending_id for _, pending_id in sorted(created)])
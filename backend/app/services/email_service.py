@@ -0,0 +1,344 @@
+"""
+Email outbox: enqueue_email adds a row inside the caller's transaction (e.g. the one that marks
+a PendingUpdate sent); the dispatcher claims due rows in batches and sends them over a pool of
+reused SMTP connections, with per-tenant rate limits and retries with backoff.
+"""
+import logging
+import math
+import queue
+import random
+import smtplib
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from email.message import EmailMessage
+from typing import Iterator
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.db import SessionLocal
+from app.models.email_outbox import EmailOutbox, uuid_str
+from app.services.quickbooks_service import TokenBucket
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+MIN_CLAIM_LEASE = timedelta(minutes=5)
+MAX_BACKOFF = timedelta(hours=1)
+
+
+def _as_utc(dt: datetime) -> datetime:
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def enqueue_email(
+    db: Session,
+    tenant_id: str,
+    to_address: str | None,
+    subject: str,
+    body_html: str,
+    body_plain: str | None = None,
+    pending_update_id: str | None = None,
+) -> EmailOutbox:
+    """Add an outbox row to the caller's transaction (not committed here)."""
+    row = EmailOutbox(**outbox_row(tenant_id, to_address, subject, body_html, body_plain, pending_update_id))
+    db.add(row)
+    return row
+
+
+def outbox_row(
+    tenant_id: str,
+    to_address: str | None,
+    subject: str,
+    body_html: str,
+    body_plain: str | None = None,
+    pending_update_id: str | None = None,
+) -> dict:
+    """Column values for a new outbox row; also used directly for bulk INSERTs."""
+    now = datetime.now(timezone.utc)
+    return {
+        "id": uuid_str(),
+        "tenant_id": tenant_id,
+        "pending_update_id": pending_update_id,
+        "to_address": to_address,
+        "subject": subject,
+        "body_html": body_html,
+        "body_plain": body_plain,
+        "status": "queued" if to_address else "failed",
+        "attempts": 0,
+        "next_attempt_at": now,
+        "last_error": None if to_address else "Client has no email address",
+        "created_at": now,
+    }
+
+
+class SMTPPool:
+    """Up to `size` SMTP connections, kept open and reused across batches."""
+
+    def __init__(self, size: int):
+        self._idle: "queue.LifoQueue[smtplib.SMTP]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max(size, 1))
+
+    def _connect(self) -> smtplib.SMTP:
+        conn = smtplib.SMTP(settings.smtp_host, settings.smtp_port, timeout=settings.smtp_timeout_seconds)
+        if settings.smtp_use_tls:
+            conn.starttls()
+        if settings.smtp_username:
+            conn.login(settings.smtp_username, settings.smtp_password)
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[smtplib.SMTP]:
+        with self._slots:
+            conn = None
+            try:
+                conn = self._idle.get_nowait()
+                if conn.noop()[0] != 250:
+                    raise smtplib.SMTPServerDisconnected("stale connection")
+            except queue.Empty:
+                conn = self._connect()
+            except (smtplib.SMTPException, OSError):
+                self._discard(conn)
+                conn = self._connect()
+            try:
+                yield conn
+            except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused):
+                # Refusals leave the session usable (smtplib sends RSET). Checked before OSError:
+                # every SMTPException is an OSError
+                self._idle.put(conn)
+                raise
+            except (smtplib.SMTPServerDisconnected, OSError):
+                self._discard(conn)
+                raise
+            except Exception:
+                self._idle.put(conn)
+                raise
+            self._idle.put(conn)
+
+    @staticmethod
+    def _discard(conn: smtplib.SMTP | None) -> None:
+        if conn is None:
+            return
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def close(self) -> None:
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                conn.quit()
+            except Exception:
+                self._discard(conn)
+
+
+_pool: SMTPPool | None = None
+_buckets: dict[str, TokenBucket] = {}
+_lock = threading.Lock()
+
+
+def get_smtp_pool() -> SMTPPool:
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = SMTPPool(settings.email_concurrency)
+        return _pool
+
+
+def get_tenant_bucket(tenant_id: str) -> TokenBucket:
+    with _lock:
+        bucket = _buckets.get(tenant_id)
+        if bucket is None:
+            bucket = _buckets[tenant_id] = TokenBucket(settings.email_rate_limit_per_minute, 60.0)
+        return bucket
+
+
+def email_backoff(attempts: int) -> timedelta:
+    """Delay before retrying a row that has failed `attempts` times (jittered exponential)."""
+    base = settings.email_backoff_base_seconds
+    return min(timedelta(seconds=base * (2 ** (attempts - 1)) + random.uniform(0, base)), MAX_BACKOFF)
+
+
+def claim_lease() -> timedelta:
+    """
+    How long a claimed row stays leased (then it is retried, e.g. if its sender died): the
+    sends each SMTP connection makes for one batch, at up to two timeouts each (connect, send).
+    """
+    sends_per_connection = math.ceil(settings.email_batch_size / max(settings.email_concurrency, 1))
+    return max(timedelta(seconds=sends_per_connection * settings.smtp_timeout_seconds * 2), MIN_CLAIM_LEASE)
+
+
+def claim_batch(db: Session, limit: int) -> list[EmailOutbox]:
+    """
+    Lease up to `limit` due rows: queued rows whose next_attempt_at has passed, and sending
+    rows whose lease expired. The UPDATE re-checks the condition, so concurrent dispatchers
+    never both claim a row. A claimed row's next_attempt_at is its lease expiry, which also
+    identifies the lease when the outcome is written back.
+    """
+    now = datetime.now(timezone.utc)
+    due = (
+        EmailOutbox.status.in_(("queued", "sending")),
+        EmailOutbox.next_attempt_at <= now,
+    )
+    ids = [
+        r.id
+        for r in db.query(EmailOutbox.id)
+        .filter(*due)
+        .order_by(EmailOutbox.next_attempt_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .all()
+    ]
+    if not ids:
+        db.commit()
+        return []
+    stmt = (
+        update(EmailOutbox)
+        .where(EmailOutbox.id.in_(ids), *due)
+        .values(status="sending", next_attempt_at=now + claim_lease())
+        .execution_options(synchronize_session=False)
+    )
+    if db.get_bind().dialect.update_returning:
+        claimed = {r.id for r in db.execute(stmt.returning(EmailOutbox.id))}
+    else:
+        db.execute(stmt)
+        claimed = set(ids)
+    db.commit()
+    return db.query(EmailOutbox).filter(EmailOutbox.id.in_(claimed)).all() if claimed else []
+
+
+def sender_address() -> str:
+    """SMTP_FROM, else SMTP_USERNAME when it is an address; "" means no sender is configured."""
+    if settings.smtp_from:
+        return settings.smtp_from
+    return settings.smtp_username if "@" in settings.smtp_username else ""
+
+
+def email_enabled() -> bool:
+    """The dispatcher needs a server and a real sender (an empty From would send MAIL FROM:<>)."""
+    return bool(settings.smtp_host and sender_address())
+
+
+def _message(row: EmailOutbox) -> EmailMessage:
+    msg = EmailMessage()
+    msg["From"] = sender_address()
+    msg["To"] = row.to_address
+    msg["Subject"] = row.subject
+    msg.set_content(row.body_plain or row.body_html)
+    msg.add_alternative(row.body_html, subtype="html")
+    return msg
+
+
+def _send(pool: SMTPPool, row: EmailOutbox) -> dict:
+    """Send one claimed row; returns the column values to write back for it."""
+    wait = get_tenant_bucket(row.tenant_id).reserve()
+    if wait > 0:
+        # Tenant is over its send rate: release the row until a token is available
+        return {
+            "id": row.id,
+            "status": "queued",
+            "next_attempt_at": datetime.now(timezone.utc) + timedelta(seconds=wait),
+        }
+    attempts = (row.attempts or 0) + 1
+    try:
+        with pool.connection() as conn:
+            conn.send_message(_message(row))
+    except smtplib.SMTPRecipientsRefused as e:
+        # 4xx (mailbox busy, greylisting) is worth retrying; only 5xx refusals are final
+        permanent = all(code >= 500 for code, _ in e.recipients.values())
+        return _failure(row, attempts, e, permanent)
+    except (smtplib.SMTPSenderRefused, smtplib.SMTPDataError) as e:
+        return _failure(row, attempts, e, permanent=e.smtp_code >= 500)
+    except (smtplib.SMTPException, OSError) as e:
+        return _failure(row, attempts, e, permanent=False)
+    sent_at = datetime.now(timezone.utc)
+    latency_ms = int((sent_at - _as_utc(row.created_at)).total_seconds() * 1000) if row.created_at else None
+    return {"id": row.id, "status": "sent", "attempts": attempts, "sent_at": sent_at, "latency_ms": latency_ms, "last_error": None}
+
+
+def _failure(row: EmailOutbox, attempts: int, error: Exception, permanent: bool) -> dict:
+    logger.warning("Email %s attempt %d failed: %s", row.id, attempts, error)
+    if permanent or attempts >= settings.email_max_attempts:
+        return {"id": row.id, "status": "failed", "attempts": attempts, "last_error": str(error)}
+    return {
+        "id": row.id,
+        "status": "queued",
+        "attempts": attempts,
+        "last_error": str(error),
+        "next_attempt_at": datetime.now(timezone.utc) + email_backoff(attempts),
+    }
+
+
+def _record(db: Session, row: EmailOutbox, outcome: dict) -> bool:
+    """Write one send outcome, only if the row is still under the lease this dispatcher took."""
+    values = {k: v for k, v in outcome.items() if k != "id"}
+    n = db.execute(
+        update(EmailOutbox)
+        .where(
+            EmailOutbox.id == row.id,
+            EmailOutbox.status == "sending",
+            EmailOutbox.next_attempt_at == row.next_attempt_at,
+        )
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    if not n:
+        logger.warning("Email %s: lease lost before its outcome (%s) was recorded", row.id, outcome["status"])
+    return n > 0
+
+
+def dispatch_batch(db: Session, executor: ThreadPoolExecutor | None = None) -> int:
+    """
+    Claim one batch and send it concurrently. Each outcome is committed as soon as its send
+    finishes, so sent rows never wait on slower ones past their lease. Returns rows claimed.
+    """
+    rows = claim_batch(db, settings.email_batch_size)
+    if not rows:
+        return 0
+    # Detach: the per-row commits below must not expire rows the sender threads are reading
+    db.expunge_all()
+    pool = get_smtp_pool()
+    sent: list[int] = []
+
+    def record(row: EmailOutbox, outcome: dict) -> None:
+        if _record(db, row, outcome) and outcome["status"] == "sent" and outcome.get("latency_ms") is not None:
+            sent.append(outcome["latency_ms"])
+
+    if executor is None:
+        for row in rows:
+            record(row, _send(pool, row))
+    else:
+        futures = {executor.submit(_send, pool, row): row for row in rows}
+        for future in as_completed(futures):
+            record(futures[future], future.result())
+    if sent:
+        logger.info(
+            "Sent %d emails (%d claimed); delivery latency avg %d ms, max %d ms",
+            len(sent), len(rows), sum(sent) // len(sent), max(sent),
+        )
+    return len(rows)
+
+
+def drain_outbox(max_batches: int = 100) -> int:
+    """Dispatch batches until nothing is due (or max_batches). Returns rows processed."""
+    if not email_enabled():
+        return 0
+    total = 0
+    db = SessionLocal()
+    try:
+        with ThreadPoolExecutor(max_workers=max(settings.email_concurrency, 1), thread_name_prefix="email") as ex:
+            for _ in range(max_batches):
+                n = dispatch_batch(db, ex)
+                total += n
+                if n < settings.email_batch_size:
+                    break
+    finally:
+        db.close()
+    return total
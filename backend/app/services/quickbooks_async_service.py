@@ -0,0 +1,213 @@
+"""
+Async QuickBooks API access (httpx), for fanning out many queries concurrently.
+Shares rate limits, retry policy and OAuth refresh with quickbooks_service; the sync
+functions there remain the default for callers that don't run an event loop.
+"""
+import asyncio
+import weakref
+from typing import Any, AsyncIterator, Callable
+import httpx
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.models.quickbooks import QuickBooksConnection
+from app.services.quickbooks_service import (
+    QB_MAX_PAGE_SIZE,
+    QB_RETRY_STATUSES,
+    get_base_url,
+    QBCredentials,
+    QBQueryIncomplete,
+    get_credentials,
+    get_realm_limiter,
+    group_invoices_by_customer,
+    refresh_connection,
+    retry_delay,
+)
+
+settings = get_settings()
+
+# One client (connection pool) and per-realm semaphore per event loop: httpx/asyncio
+# objects are bound to the loop that created them.
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[str, asyncio.Semaphore]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_async_client() -> httpx.AsyncClient:
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(
+            timeout=30,
+            limits=httpx.Limits(max_connections=settings.qb_http_pool_size),
+        )
+        _clients[loop] = client
+    return client
+
+
+def _realm_semaphore(realm_id: str) -> asyncio.Semaphore:
+    per_loop = _semaphores.setdefault(asyncio.get_running_loop(), {})
+    sem = per_loop.get(realm_id)
+    if sem is None:
+        sem = per_loop[realm_id] = asyncio.Semaphore(max(settings.qb_max_concurrent_per_realm, 1))
+    return sem
+
+
+async def close_async_client() -> None:
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+async def qb_request_async(
+    method: str,
+    path: str,
+    access_token: str,
+    realm_id: str,
+    json_data: dict | None = None,
+    params: dict | None = None,
+) -> dict[str, Any]:
+    """Async qb_request: same per-realm rate limit (shared token bucket), retries and errors."""
+    url = f"{get_base_url()}/v3/company/{realm_id}/{path.lstrip('/')}"
+    headers = {"Authorization": f"Bearer {access_token}", "Accept": "application/json"}
+    client = get_async_client()
+    bucket = get_realm_limiter(realm_id).bucket
+    attempt = 0
+    while True:
+        try:
+            async with _realm_semaphore(realm_id):
+                while (wait := bucket.reserve()) > 0:
+                    await asyncio.sleep(wait)
+                resp = await client.request(method, url, headers=headers, json=json_data, params=params)
+        except httpx.TransportError:
+            if attempt >= settings.qb_max_retries:
+                raise
+            await asyncio.sleep(retry_delay(attempt))
+            attempt += 1
+            continue
+        if resp.status_code in QB_RETRY_STATUSES and attempt < settings.qb_max_retries:
+            await asyncio.sleep(retry_delay(attempt, resp.headers.get("Retry-After")))
+            attempt += 1
+            continue
+        resp.raise_for_status()
+        return resp.json() if resp.content else {}
+
+
+async def get_credentials_async(db: Session, tenant_id: str) -> QBCredentials | None:
+    """get_credentials with the (blocking) DB lookup / intuit-oauth refresh moved off the event loop."""
+    return await asyncio.to_thread(get_credentials, db, tenant_id)
+
+
+async def refresh_connection_async(db: Session, conn: QuickBooksConnection) -> QuickBooksConnection | None:
+    return await asyncio.to_thread(refresh_connection, db, conn)
+
+
+async def _query(creds: QBCredentials, query: str) -> dict[str, Any]:
+    data = await qb_request_async("GET", "query", creds.access_token, creds.realm_id, params={"query": query})
+    return data.get("QueryResponse", {})
+
+
+async def iter_query_pages_async(
+    db: Session,
+    tenant_id: str,
+    entity: str,
+    where: str = "",
+    order_by: str = "Id",
+    page_size: int | None = None,
+) -> AsyncIterator[list[dict]]:
+    """
+    Count the rows, then fetch every STARTPOSITION page concurrently (bounded by the realm
+    semaphore). Pages are yielded in completion order, not query order; a row shifted onto a
+    second page is only yielded once. If the last page comes back full (rows added since the
+    count), a sequential walk continues until a short page.
+    Raises QBQueryIncomplete instead of returning short: no credentials, no totalCount, or
+    fewer distinct rows than counted (rows deleted mid-sweep shift later pages past a read).
+    """
+    # Resolved once: the Session must not be shared across concurrent page tasks
+    creds = await get_credentials_async(db, tenant_id)
+    if not creds:
+        raise QBQueryIncomplete(f"QuickBooks credentials unavailable for {entity} query")
+    page_size = max(1, min(page_size or settings.qb_page_size, QB_MAX_PAGE_SIZE))
+    where_clause = f" WHERE {where}" if where else ""
+    counted = await _query(creds, f"SELECT COUNT(*) FROM {entity}{where_clause}")
+    if "totalCount" not in counted:
+        raise QBQueryIncomplete(f"QuickBooks returned no count for {entity} query")
+    total = counted["totalCount"]
+    seen: set[str] = set()
+
+    def unseen(rows: list[dict]) -> list[dict]:
+        fresh = [r for r in rows if str(r.get("Id")) not in seen]
+        seen.update(str(r.get("Id")) for r in fresh)
+        return fresh
+
+    async def page(start: int) -> tuple[int, list[dict]]:
+        qr = await _query(
+            creds,
+            f"SELECT * FROM {entity}{where_clause} ORDER BY {order_by} STARTPOSITION {start} MAXRESULTS {page_size}",
+        )
+        return start, qr.get(entity, [])
+
+    starts = list(range(1, total + 1, page_size))
+    last_full = False
+    tasks = [asyncio.create_task(page(start)) for start in starts]
+    try:
+        for next_page in asyncio.as_completed(tasks):
+            start, rows = await next_page
+            if start == starts[-1]:
+                last_full = len(rows) >= page_size
+            yield unseen(rows)
+    finally:
+        for t in tasks:
+            t.cancel()
+    if len(seen) < total:
+        raise QBQueryIncomplete(f"{entity} sweep read {len(seen)} of {total} rows; the data changed mid-sweep")
+    start = len(starts) * page_size + 1
+    while last_full:
+        _, rows = await page(start)
+        yield unseen(rows)
+        last_full = len(rows) >= page_size
+        start += page_size
+
+
+async def fetch_customers_async(db: Session, tenant_id: str) -> list[dict]:
+    rows: list[dict] = []
+    async for page in iter_query_pages_async(db, tenant_id, "Customer", where="Active = true"):
+        rows.extend(page)
+    return rows
+
+
+async def fetch_invoices_async(db: Session, tenant_id: str, customer_id: str | None = None) -> list[dict]:
+    where = f"CustomerRef = '{customer_id}'" if customer_id else ""
+    rows: list[dict] = []
+    async for page in iter_query_pages_async(db, tenant_id, "Invoice", where=where):
+        rows.extend(page)
+    return rows
+
+
+async def fetch_invoices_by_customer_async(
+    db: Session,
+    tenant_id: str,
+    transform: Callable[[dict], dict] | None = None,
+) -> dict[str, list[dict]]:
+    """Concurrent tenant-wide invoice sweep, grouped by CustomerRef. Order within a group is arbitrary."""
+    grouped: dict[str, list[dict]] = {}
+    async for page in iter_query_pages_async(db, tenant_id, "Invoice"):
+        for customer_id, rows in group_invoices_by_customer(page, transform).items():
+            grouped.setdefault(customer_id, []).extend(rows)
+    return grouped
+
+
+def sweep_invoices_by_customer(
+    db: Session,
+    tenant_id: str,
+    transform: Callable[[dict], dict] | None = None,
+) -> dict[str, list[dict]]:
+    """Blocking entry point for threads without an event loop (e.g. background agent runs)."""
+    async def _run() -> dict[str, list[dict]]:
+        try:
+            return await fetch_invoices_by_customer_async(db, tenant_id, transform)
+        finally:
+            await close_async_client()
+
+    return asyncio.run(_run())
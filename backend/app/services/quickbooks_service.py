@@ -1,20 +1,35 @@
 """QuickBooks OAuth and API access. Uses intuit-oauth for tokens and requests for API calls."""
 import json
-from datetime import datetime, timedelta
-from typing import Any
+import random
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Iterable, Iterator
 import requests
+from requests.adapters import HTTPAdapter
 from intuitlib.client import AuthClient
 from intuitlib.exceptions import AuthClientError
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 
 from app.config import get_settings
 from app.models.quickbooks import QuickBooksConnection
 from app.models.tenant import Tenant
-from app.models.client import Client
+from app.models.client import Client, uuid_str
 
 settings = get_settings()
 QB_BASE_SANDBOX = "https://sandbox-quickbooks.api.intuit.com"
 QB_BASE_PROD = "https://quickbooks.api.intuit.com"
+QB_MAX_PAGE_SIZE = 1000  # QuickBooks query MAXRESULTS upper bound
+QB_CDC_MAX_RESULTS = 1000  # CDC returns at most this many objects per entity
+QB_RETRY_STATUSES = {429, 500, 502, 503, 504}
+QB_MAX_BACKOFF_SECONDS = 60.0
+
+
+class QBQueryIncomplete(RuntimeError):
+    """A QuickBooks query could not be read to the end; the rows seen so far are not the full result."""
 
 
 def get_auth_client() -> AuthClient:
@@ -48,32 +63,192 @@ def get_base_url() -> str:
     return QB_BASE_SANDBOX if settings.qb_environment == "sandbox" else QB_BASE_PROD
 
 
+TOKEN_REFRESH_MARGIN = timedelta(minutes=5)
+
+
+@dataclass(frozen=True)
+class QBCredentials:
+    """What an API call needs from a QuickBooksConnection; safe to share across threads."""
+    tenant_id: str
+    realm_id: str
+    access_token: str
+    expires_at: datetime
+
+
+_credentials: dict[str, QBCredentials] = {}
+_refresh_locks: dict[str, threading.Lock] = {}
+_credentials_lock = threading.Lock()
+
+
+def _as_utc(dt: datetime) -> datetime:
+    # SQLite returns naive datetimes even for timezone=True columns
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt
+
+
+def _is_fresh(expires_at: datetime | None) -> bool:
+    return expires_at is not None and _as_utc(expires_at) - datetime.now(timezone.utc) >= TOKEN_REFRESH_MARGIN
+
+
+def _refresh_lock(tenant_id: str) -> threading.Lock:
+    with _credentials_lock:
+        lock = _refresh_locks.get(tenant_id)
+        if lock is None:
+            lock = _refresh_locks[tenant_id] = threading.Lock()
+        return lock
+
+
+def _cache_credentials(conn: QuickBooksConnection) -> QBCredentials:
+    creds = QBCredentials(
+        tenant_id=conn.tenant_id,
+        realm_id=conn.realm_id,
+        access_token=conn.access_token,
+        expires_at=_as_utc(conn.token_expires_at),
+    )
+    with _credentials_lock:
+        _credentials[conn.tenant_id] = creds
+    return creds
+
+
+def invalidate_credentials(tenant_id: str) -> None:
+    """Drop the cached token, e.g. after the tenant reconnects QuickBooks."""
+    with _credentials_lock:
+        _credentials.pop(tenant_id, None)
+
+
 def get_valid_connection(db: Session, tenant_id: str) -> QuickBooksConnection | None:
     conn = db.query(QuickBooksConnection).filter(QuickBooksConnection.tenant_id == tenant_id).first()
     if not conn:
         return None
-    # Refresh if expiring within 5 minutes
-    from datetime import timezone
-    now = datetime.now(timezone.utc)
-    if conn.token_expires_at and (conn.token_expires_at - now) < timedelta(minutes=5):
-        conn = refresh_connection(db, conn)
+    # Refresh if expiring within 5 minutes; one refresh per tenant at a time (single flight)
+    if conn.token_expires_at and not _is_fresh(conn.token_expires_at):
+        with _refresh_lock(tenant_id):
+            db.refresh(conn)  # another thread may have refreshed while we waited
+            if not _is_fresh(conn.token_expires_at):
+                conn = refresh_connection(db, conn)
+    if conn:
+        _cache_credentials(conn)
     return conn
 
 
+def get_credentials(db: Session, tenant_id: str) -> QBCredentials | None:
+    """
+    Access token and realm for API calls, served from memory until near expiry so the run
+    loop does not query QuickBooksConnection per call. On expiry, exactly one caller per
+    tenant refreshes; concurrent callers wait on the lock and reuse its result.
+    """
+    with _credentials_lock:
+        creds = _credentials.get(tenant_id)
+    if creds and _is_fresh(creds.expires_at):
+        return creds
+    conn = get_valid_connection(db, tenant_id)
+    if not conn:
+        invalidate_credentials(tenant_id)
+        return None
+    with _credentials_lock:
+        return _credentials.get(tenant_id)
+
+
 def refresh_connection(db: Session, conn: QuickBooksConnection) -> QuickBooksConnection | None:
     auth_client = get_auth_client()
     auth_client.refresh_token = conn.refresh_token
     try:
         auth_client.refresh()
     except AuthClientError:
+        invalidate_credentials(conn.tenant_id)
         return None
     conn.access_token = auth_client.access_token
-    conn.token_expires_at = datetime.utcnow() + timedelta(seconds=auth_client.expires_in)
+    if auth_client.refresh_token:
+        # Intuit rotates refresh tokens; keeping the old one eventually breaks the connection
+        conn.refresh_token = auth_client.refresh_token
+    conn.token_expires_at = datetime.now(timezone.utc) + timedelta(seconds=auth_client.expires_in)
     db.commit()
     db.refresh(conn)
     return conn
 
 
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per `per` seconds, bursting up to `rate`."""
+
+    def __init__(self, rate: int, per: float = 60.0):
+        self.capacity = float(max(rate, 1))
+        self.tokens = self.capacity
+        self.fill_rate = self.capacity / per
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take a token if available (returns 0.0), else return seconds until one will be."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.fill_rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.fill_rate
+
+    def acquire(self) -> None:
+        while (wait := self.reserve()) > 0:
+            time.sleep(wait)
+
+
+class RealmLimiter:
+    """Intuit's per-realm quotas: requests per minute (token bucket) and concurrent requests."""
+
+    def __init__(self, per_minute: int, max_concurrent: int):
+        self.bucket = TokenBucket(per_minute, 60.0)
+        self.concurrency = threading.BoundedSemaphore(max(max_concurrent, 1))
+
+    def __enter__(self) -> "RealmLimiter":
+        self.concurrency.acquire()
+        self.bucket.acquire()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.concurrency.release()
+
+
+_session: requests.Session | None = None
+_limiters: dict[str, RealmLimiter] = {}
+_http_lock = threading.Lock()
+
+
+def get_http_session() -> requests.Session:
+    """Per-process pooled session, so QuickBooks calls reuse keep-alive TLS connections."""
+    global _session
+    with _http_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=settings.qb_http_pool_size)
+            session.mount("https://", adapter)
+            _session = session
+        return _session
+
+
+def get_realm_limiter(realm_id: str) -> RealmLimiter:
+    with _http_lock:
+        limiter = _limiters.get(realm_id)
+        if limiter is None:
+            limiter = RealmLimiter(settings.qb_rate_limit_per_minute, settings.qb_max_concurrent_per_realm)
+            _limiters[realm_id] = limiter
+        return limiter
+
+
+def retry_delay(attempt: int, retry_after: str | None = None) -> float:
+    """Seconds to wait before retry `attempt` (0-based): Retry-After if given, else jittered backoff."""
+    if retry_after:
+        try:
+            return min(max(float(retry_after), 0.0), QB_MAX_BACKOFF_SECONDS)
+        except ValueError:
+            try:
+                delta = parsedate_to_datetime(retry_after) - datetime.now(timezone.utc)
+                return min(max(delta.total_seconds(), 0.0), QB_MAX_BACKOFF_SECONDS)
+            except (TypeError, ValueError):
+                pass
+    base = settings.qb_backoff_base_seconds
+    return min(base * (2 ** attempt) + random.uniform(0, base), QB_MAX_BACKOFF_SECONDS)
+
+
 def qb_request(
     method: str,
     path: str,
@@ -82,76 +257,223 @@ def qb_request(
     json_data: dict | None = None,
     params: dict | None = None,
 ) -> dict[str, Any]:
+    """
+    Call the QuickBooks API on the pooled session, within the realm's rate and concurrency
+    limits. 429, transient 5xx and connection errors are retried with exponential backoff,
+    honoring Retry-After; other errors raise as before.
+    """
     base = get_base_url()
     url = f"{base}/v3/company/{realm_id}/{path.lstrip('/')}"
     headers = {"Authorization": f"Bearer {access_token}", "Accept": "application/json"}
     if json_data is not None:
         headers["Content-Type"] = "application/json"
-    resp = requests.request(
-        method,
-        url,
-        headers=headers,
-        json=json_data,
-        params=params,
-        timeout=30,
-    )
-    resp.raise_for_status()
-    return resp.json() if resp.content else {}
+    session = get_http_session()
+    limiter = get_realm_limiter(realm_id)
+    attempt = 0
+    while True:
+        try:
+            with limiter:
+                resp = session.request(
+                    method,
+                    url,
+                    headers=headers,
+                    json=json_data,
+                    params=params,
+                    timeout=30,
+                )
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt >= settings.qb_max_retries:
+                raise
+            time.sleep(retry_delay(attempt))
+            attempt += 1
+            continue
+        if resp.status_code in QB_RETRY_STATUSES and attempt < settings.qb_max_retries:
+            time.sleep(retry_delay(attempt, resp.headers.get("Retry-After")))
+            attempt += 1
+            continue
+        resp.raise_for_status()
+        return resp.json() if resp.content else {}
+
+
+def iter_query(
+    db: Session,
+    tenant_id: str,
+    entity: str,
+    where: str = "",
+    order_by: str = "Id",
+    page_size: int | None = None,
+) -> Iterator[dict]:
+    """
+    Lazily yield every row of a QuickBooks query, walking STARTPOSITION until a short page.
+    Only one page is held at a time. Page size defaults to settings.qb_page_size (max 1000).
+    Raises QBQueryIncomplete if credentials are unavailable, rather than ending early.
+    """
+    page_size = max(1, min(page_size or settings.qb_page_size, QB_MAX_PAGE_SIZE))
+    where_clause = f" WHERE {where}" if where else ""
+    start = 1
+    while True:
+        # Re-checked per page (from memory) so a long walk picks up a refreshed token
+        creds = get_credentials(db, tenant_id)
+        if not creds:
+            raise QBQueryIncomplete(f"QuickBooks credentials unavailable for {entity} query at row {start}")
+        query = (
+            f"SELECT * FROM {entity}{where_clause} ORDER BY {order_by} "
+            f"STARTPOSITION {start} MAXRESULTS {page_size}"
+        )
+        data = qb_request("GET", "query", creds.access_token, creds.realm_id, params={"query": query})
+        page = data.get("QueryResponse", {}).get(entity, [])
+        yield from page
+        if len(page) < page_size:
+            return
+        start += page_size
+
+
+def iter_customers(db: Session, tenant_id: str) -> Iterator[dict]:
+    return iter_query(db, tenant_id, "Customer", where="Active = true")
+
+
+def iter_invoices(db: Session, tenant_id: str, customer_id: str | None = None) -> Iterator[dict]:
+    """All invoices (tenant-wide sweep), or one customer's newest first."""
+    if customer_id:
+        return iter_query(db, tenant_id, "Invoice", where=f"CustomerRef = '{customer_id}'", order_by="TxnDate DESC")
+    return iter_query(db, tenant_id, "Invoice")
 
 
 def fetch_customers(db: Session, tenant_id: str) -> list[dict]:
-    conn = get_valid_connection(db, tenant_id)
-    if not conn:
-        return []
-    data = qb_request("GET", "query", conn.access_token, conn.realm_id, params={
-        "query": "SELECT * FROM Customer WHERE Active = true MAXRESULTS 1000"
-    })
-    return data.get("QueryResponse", {}).get("Customer", [])
+    return list(iter_customers(db, tenant_id))
 
 
 def fetch_invoices(db: Session, tenant_id: str, customer_id: str | None = None) -> list[dict]:
-    conn = get_valid_connection(db, tenant_id)
-    if not conn:
-        return []
-    query = "SELECT * FROM Invoice ORDER BY TxnDate DESC MAXRESULTS 500"
-    if customer_id:
-        query = f"SELECT * FROM Invoice WHERE CustomerRef = '{customer_id}' ORDER BY TxnDate DESC MAXRESULTS 500"
-    data = qb_request("GET", "query", conn.access_token, conn.realm_id, params={"query": query})
-    return data.get("QueryResponse", {}).get("Invoice", [])
+    return list(iter_invoices(db, tenant_id, customer_id))
 
 
-def sync_clients_from_qb(db: Session, tenant_id: str) -> list[Client]:
-    """Ensure Client rows exist for each QB Customer; update display name / company."""
-    customers = fetch_customers(db, tenant_id)
-    clients = []
+def group_invoices_by_customer(
+    invoices: Iterable[dict],
+    transform: Callable[[dict], dict] | None = None,
+) -> dict[str, list[dict]]:
+    """
+    Bucket invoices by CustomerRef value (QB Customer.Id). Consumes iterators lazily;
+    pass transform to keep only a reduced form of each invoice instead of the full payload.
+    """
+    grouped: dict[str, list[dict]] = {}
+    for inv in invoices:
+        customer_id = str((inv.get("CustomerRef") or {}).get("value", ""))
+        if customer_id:
+            grouped.setdefault(customer_id, []).append(transform(inv) if transform else inv)
+    return grouped
+
+
+def fetch_changes_since(db: Session, tenant_id: str, since: datetime) -> dict[str, list[dict]] | None:
+    """
+    Customers and Invoices changed since the watermark, via the QuickBooks CDC endpoint.
+    Returns {"Customer": [...], "Invoice": [...]}, or None when the caller must fall back
+    to a full sweep (watermark older than CDC allows, truncated result, or deleted invoices,
+    which CDC returns without a CustomerRef).
+    """
+    since = _as_utc(since)
+    if datetime.now(timezone.utc) - since > timedelta(days=settings.qb_cdc_max_age_days):
+        return None
+    creds = get_credentials(db, tenant_id)
+    if not creds:
+        return None
+    data = qb_request("GET", "cdc", creds.access_token, creds.realm_id, params={
+        "entities": "Customer,Invoice",
+        "changedSince": since.isoformat(timespec="seconds"),
+    })
+    changes: dict[str, list[dict]] = {"Customer": [], "Invoice": []}
+    for cdc in data.get("CDCResponse", []):
+        for qr in cdc.get("QueryResponse", []):
+            for entity in changes:
+                changes[entity].extend(qr.get(entity, []))
+    if any(len(rows) >= QB_CDC_MAX_RESULTS for rows in changes.values()):
+        return None
+    if any(inv.get("status") == "Deleted" for inv in changes["Invoice"]):
+        return None
+    return changes
+
+
+def _upsert_clients(db: Session, rows: list[dict]) -> None:
+    """INSERT ... ON CONFLICT (tenant_id, qb_customer_id) DO UPDATE; email is kept when QB has none."""
+    if not rows:
+        return
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        for row in rows:
+            if row["email"] is None:
+                # Unset attributes are not merged, so the stored email is kept
+                row = {k: v for k, v in row.items() if k != "email"}
+            db.merge(Client(**row))
+        return
+    table = Client.__table__
+    for i in range(0, len(rows), settings.db_write_batch_size):
+        stmt = insert(table).values(rows[i:i + settings.db_write_batch_size])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.tenant_id, table.c.qb_customer_id],
+            set_={
+                "display_name": stmt.excluded.display_name,
+                "company_name": stmt.excluded.company_name,
+                "email": func.coalesce(stmt.excluded.email, table.c.email),
+                "updated_at": func.now(),
+            },
+        )
+        db.execute(stmt)
+
+
+def sync_clients_from_qb(db: Session, tenant_id: str, customers: Iterable[dict] | None = None) -> list[Client]:
+    """
+    Ensure Client rows exist for each QB Customer; update display name / company.
+    Pass customers (e.g. from fetch_changes_since) to sync only those instead of fetching all.
+    Existing clients are preloaded once; only new or changed rows are written, via bulk upsert
+    flushed every db_write_batch_size rows while customer pages stream in.
+    """
+    if customers is None:
+        customers = iter_customers(db, tenant_id)
+    existing = {
+        c.qb_customer_id: c
+        for c in db.query(Client).filter(Client.tenant_id == tenant_id)
+    }
+    synced_ids: set[str] = set()
+    rows: list[dict] = []
+    written = 0
     for c in customers:
+        if c.get("status") == "Deleted" or c.get("Active") is False:
+            continue
         qb_id = str(c.get("Id", ""))
         display = c.get("DisplayName") or c.get("FullyQualifiedName") or "Unknown"
         company = (c.get("CompanyName") or "").strip() or None
         primary_email = None
         if c.get("PrimaryEmailAddr"):
             primary_email = c.get("PrimaryEmailAddr", {}).get("Address")
-        existing = db.query(Client).filter(
-            Client.tenant_id == tenant_id,
-            Client.qb_customer_id == qb_id,
-        ).first()
-        if existing:
-            existing.display_name = display
-            existing.company_name = company
-            if primary_email:
-                existing.email = primary_email
-            clients.append(existing)
-        else:
-            client = Client(
-                tenant_id=tenant_id,
-                qb_customer_id=qb_id,
-                display_name=display,
-                company_name=company,
-                email=primary_email,
-            )
-            db.add(client)
-            clients.append(client)
+        synced_ids.add(qb_id)
+        current = existing.get(qb_id)
+        if current and (
+            current.display_name == display
+            and current.company_name == company
+            and (not primary_email or current.email == primary_email)
+        ):
+            continue
+        rows.append({
+            "id": current.id if current else uuid_str(),
+            "tenant_id": tenant_id,
+            "qb_customer_id": qb_id,
+            "display_name": display,
+            "company_name": company,
+            "email": primary_email,
+        })
+        if len(rows) >= settings.db_write_batch_size:
+            _upsert_clients(db, rows)
+            written += len(rows)
+            rows = []
+    _upsert_clients(db, rows)
+    written += len(rows)
     db.commit()
-    for c in clients:
-        db.refresh(c)
-    return clients
+    if not written:
+        return [existing[qb_id] for qb_id in synced_ids]
+    return [
+        c for c in db.query(Client).filter(Client.tenant_id == tenant_id).populate_existing()
+        if c.qb_customer_id in synced_ids
+    ]
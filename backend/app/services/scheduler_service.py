@@ -0,0 +1,171 @@
+"""
+Periodic agent runs for every active, QuickBooks-connected tenant (APScheduler).
+Each process owns the tenants whose id hashes to its shard; runs are queued through
+agent_run_service, so a tenant with a run still queued/running is skipped.
+"""
+import logging
+import random
+import zlib
+from datetime import datetime, timedelta, timezone
+from apscheduler.schedulers.base import BaseScheduler
+from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.triggers.interval import IntervalTrigger
+
+from app.auth.cookies import purge_expired_refresh_tokens
+from app.config import get_settings
+from app.db import SessionLocal
+from app.models.tenant import Tenant
+from app.models.quickbooks import QuickBooksConnection
+from app.services.agent_run_service import enqueue_agent_run, fail_stale_runs, get_active_run
+from app.services.agent_service import prune_snapshot_history
+from app.services.email_service import drain_outbox, email_enabled
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+JOB_PREFIX = "agent-run:"
+
+
+def tenant_shard(tenant_id: str, shards: int) -> int:
+    """Stable shard for a tenant (same on every process, unlike hash())."""
+    return zlib.crc32(tenant_id.encode()) % max(shards, 1)
+
+
+def scheduled_tenants(shard_index: int, shards: int) -> dict[str, int]:
+    """tenant_id -> interval minutes for active, QB-connected tenants in this shard."""
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(Tenant.id, Tenant.agent_interval_minutes)
+            .join(QuickBooksConnection, QuickBooksConnection.tenant_id == Tenant.id)
+            .filter(Tenant.is_active)
+            .all()
+        )
+    finally:
+        db.close()
+    return {
+        tenant_id: interval or settings.agent_interval_minutes
+        for tenant_id, interval in rows
+        if tenant_shard(tenant_id, shards) == shard_index
+    }
+
+
+def run_scheduled_tenant(tenant_id: str) -> None:
+    db = SessionLocal()
+    try:
+        if get_active_run(db, tenant_id):
+            logger.info("Skipping scheduled run for tenant %s: previous run still in progress", tenant_id)
+            return
+        enqueue_agent_run(db, tenant_id)
+    except Exception:
+        logger.exception("Scheduled run for tenant %s failed to enqueue", tenant_id)
+    finally:
+        db.close()
+
+
+def refresh_tenant_jobs(scheduler: BaseScheduler, shard_index: int, shards: int) -> None:
+    """Add, reschedule, or drop per-tenant interval jobs to match the tenants table."""
+    db = SessionLocal()
+    try:
+        fail_stale_runs(db)
+    finally:
+        db.close()
+    wanted = scheduled_tenants(shard_index, shards)
+    existing = {job.id: job for job in scheduler.get_jobs() if job.id.startswith(JOB_PREFIX)}
+    now = datetime.now(timezone.utc)
+    for tenant_id, minutes in wanted.items():
+        job_id = JOB_PREFIX + tenant_id
+        trigger = IntervalTrigger(minutes=minutes, jitter=settings.scheduler_jitter_seconds)
+        job = existing.pop(job_id, None)
+        if job is None:
+            # Spread first runs across the interval instead of firing every tenant at startup
+            first_run = now + timedelta(seconds=random.uniform(0, minutes * 60))
+            scheduler.add_job(
+                run_scheduled_tenant,
+                trigger,
+                args=[tenant_id],
+                id=job_id,
+                next_run_time=first_run,
+                max_instances=1,
+                coalesce=True,
+            )
+        elif job.trigger.interval != trigger.interval:
+            job.reschedule(trigger)
+    for job_id in existing:
+        scheduler.remove_job(job_id)
+
+
+def run_snapshot_prune() -> None:
+    db = SessionLocal()
+    try:
+        deleted = prune_snapshot_history(db)
+        logger.info("Pruned %d client snapshot history rows", deleted)
+    except Exception:
+        logger.exception("Snapshot history prune failed")
+    finally:
+        db.close()
+
+
+def run_refresh_token_purge() -> None:
+    db = SessionLocal()
+    try:
+        deleted = purge_expired_refresh_tokens(db)
+        logger.info("Purged %d expired refresh tokens", deleted)
+    except Exception:
+        logger.exception("Refresh token purge failed")
+    finally:
+        db.close()
+
+
+def run_email_dispatch() -> None:
+    try:
+        drain_outbox()
+    except Exception:
+        logger.exception("Email outbox dispatch failed")
+
+
+def build_scheduler(
+    scheduler: BaseScheduler | None = None,
+    shard_index: int | None = None,
+    shards: int | None = None,
+) -> BaseScheduler:
+    shard_index = settings.scheduler_shard_index if shard_index is None else shard_index
+    shards = settings.scheduler_shards if shards is None else shards
+    scheduler = scheduler or BackgroundScheduler(timezone="UTC")
+    scheduler.add_job(
+        refresh_tenant_jobs,
+        IntervalTrigger(minutes=settings.scheduler_refresh_minutes),
+        args=[scheduler, shard_index, shards],
+        id="refresh-tenant-jobs",
+        next_run_time=datetime.now(timezone.utc),
+        max_instances=1,
+        coalesce=True,
+    )
+    if settings.smtp_host and not email_enabled():
+        logger.warning("SMTP_HOST is set but no sender address (SMTP_FROM); outgoing email is disabled")
+    if email_enabled():
+        # Every shard drains the outbox; claims are leased, so processes never send a row twice
+        scheduler.add_job(
+            run_email_dispatch,
+            IntervalTrigger(seconds=settings.email_poll_seconds),
+            id="email-dispatch",
+            max_instances=1,
+            coalesce=True,
+        )
+    if shard_index == 0:
+        # Retention is global; only one shard runs it
+        scheduler.add_job(
+            run_snapshot_prune,
+            IntervalTrigger(hours=settings.snapshot_prune_interval_hours, jitter=settings.scheduler_jitter_seconds),
+            id="prune-snapshot-history",
+            max_instances=1,
+            coalesce=True,
+        )
+        scheduler.add_job(
+            run_refresh_token_purge,
+            IntervalTrigger(hours=settings.refresh_token_purge_interval_hours, jitter=settings.scheduler_jitter_seconds),
+            id="purge-refresh-tokens",
+            max_instances=1,
+            coalesce=True,
+        )
+    return scheduler
@@ -0,0 +1,34 @@
+"""
+Standalone scheduler worker for one shard of tenants:
+
+    python -m app.worker --shard-index 0 --shards 4
+
+Run exactly one process per shard index (0..shards-1); leave SCHEDULER_ENABLED off on the API.
+"""
+import argparse
+import logging
+from apscheduler.schedulers.blocking import BlockingScheduler
+
+from app.config import get_settings
+from app.db import engine, Base
+import app.models  # noqa: F401 - ensure all models are registered
+from app.services.scheduler_service import build_scheduler
+
+
+def main() -> None:
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description="Scheduled agent runs for one tenant shard")
+    parser.add_argument("--shard-index", type=int, default=settings.scheduler_shard_index)
+    parser.add_argument("--shards", type=int, default=settings.scheduler_shards)
+    args = parser.parse_args()
+    if not 0 <= args.shard_index < args.shards:
+        parser.error("--shard-index must be in [0, --shards)")
+
+    logging.basicConfig(level=logging.INFO)
+    Base.metadata.create_all(bind=engine)
+    scheduler = build_scheduler(BlockingScheduler(timezone="UTC"), args.shard_index, args.shards)
+    scheduler.start()
+
+
+if __name__ == "__main__":
+    main()
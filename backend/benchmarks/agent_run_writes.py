@@ -0,0 +1,165 @@
+"""
+Agent-run write phase: per-row ORM writes (before RunWriter) vs RunWriter's bulk statements.
+
+For each client count, two runs over the same synced clients:
+  all drafted  - no previous snapshot; every client gets a PendingUpdate and a snapshot
+  no changes   - snapshots already current; nothing needs writing
+QuickBooks and the drafter are not involved: summaries and drafts are generated in memory.
+
+    python -m benchmarks.agent_run_writes --database-url sqlite:///./bench.db --clients 1000 10000
+"""
+from benchmarks.common import StatementCounter, configure, parse_args, print_table, reset_schema
+
+
+def _seed(n: int) -> str:
+    from app.db import SessionLocal
+    from app.models.client import Client, uuid_str
+    from app.models.tenant import Tenant
+    from sqlalchemy import insert
+
+    db = SessionLocal()
+    try:
+        tenant = Tenant(name="Bench", slug=f"bench-{uuid_str()[:8]}")
+        db.add(tenant)
+        db.commit()
+        db.execute(insert(Client), [
+            {"id": uuid_str(), "tenant_id": tenant.id, "qb_customer_id": str(i), "display_name": f"Client {i}"}
+            for i in range(n)
+        ])
+        db.commit()
+        return tenant.id
+    finally:
+        db.close()
+
+
+def _summary(client_index: int) -> dict:
+    from app.services.agent_service import summarize_invoice
+
+    invoices = [
+        summarize_invoice({"Id": f"{client_index}-{k}", "DocNumber": f"{1000 + k}", "TotalAmt": 100 + k, "Balance": 100 + k})
+        for k in range(3)
+    ]
+    return {"count": len(invoices), "invoices": invoices}
+
+
+def _draft(client) -> dict:
+    return {
+        "subject": f"Update for {client.display_name}",
+        "body_html": "<p>New invoices are available.</p>",
+        "body_plain": "New invoices are available.",
+    }
+
+
+# --- before: the per-client helpers run_agent_for_tenant used until RunWriter ---
+
+def _legacy_save_snapshot(db, client_id: str, snapshot_type: str, payload: dict) -> None:
+    import json
+    from app.models.client import ClientCurrentSnapshot, ClientSnapshot
+    from app.services.agent_service import snapshot_hash
+
+    digest = snapshot_hash(payload)
+    current = db.get(ClientCurrentSnapshot, (client_id, snapshot_type))
+    if current and current.content_hash == digest:
+        return
+    data = json.dumps(payload)
+    if current:
+        current.payload = data
+        current.content_hash = digest
+    else:
+        db.add(ClientCurrentSnapshot(client_id=client_id, snapshot_type=snapshot_type, payload=data, content_hash=digest))
+    db.add(ClientSnapshot(client_id=client_id, snapshot_type=snapshot_type, payload=data))
+
+
+def _legacy_has_recent_pending(db, client_id: str) -> bool:
+    from datetime import datetime, timedelta, timezone
+    from app.models.client import PendingUpdate
+
+    since = datetime.now(timezone.utc) - timedelta(hours=24)
+    return db.query(PendingUpdate).filter(
+        PendingUpdate.client_id == client_id,
+        PendingUpdate.status == "pending",
+        PendingUpdate.created_at >= since,
+    ).first() is not None
+
+
+def write_per_row(db, tenant_id: str) -> int:
+    from app.models.client import Client, PendingUpdate
+    from app.services.agent_service import detect_invoice_changes, get_last_snapshot
+
+    clients = db.query(Client).filter(Client.tenant_id == tenant_id).order_by(Client.qb_customer_id).all()
+    created = []
+    for client in clients:
+        current = _summary(int(client.qb_customer_id))
+        change = detect_invoice_changes(get_last_snapshot(db, client.id, "invoices"), current)
+        if not change or _legacy_has_recent_pending(db, client.id):
+            _legacy_save_snapshot(db, client.id, "invoices", current)
+            continue
+        draft = _draft(client)
+        pending = PendingUpdate(tenant_id=tenant_id, client_id=client.id, change_summary=change["summary"], status="pending", **draft)
+        db.add(pending)
+        created.append(pending)
+        _legacy_save_snapshot(db, client.id, "invoices", current)
+    db.commit()
+    for p in created:
+        db.refresh(p)
+    return len(created)
+
+
+# --- after: RunWriter, as run_agent_for_tenant uses it ---
+
+def write_batched(db, tenant_id: str) -> int:
+    from app.models.client import Client
+    from app.services.agent_service import (
+        RunWriter,
+        _parse_payload,
+        clients_with_recent_pending,
+        detect_invoice_changes,
+        get_last_snapshot,
+        load_current_snapshots,
+    )
+
+    clients = db.query(Client).filter(Client.tenant_id == tenant_id).order_by(Client.qb_customer_id).all()
+    current_snapshots = load_current_snapshots(db, tenant_id, "invoices")
+    recent_pending = clients_with_recent_pending(db, tenant_id)
+    writer = RunWriter(db, current_snapshots)
+    for client in clients:
+        current = _summary(int(client.qb_customer_id))
+        snap = current_snapshots.get((client.id, "invoices"))
+        previous = _parse_payload(snap.payload) if snap else get_last_snapshot(db, client.id, "invoices")
+        change = detect_invoice_changes(previous, current)
+        if not change or client.id in recent_pending:
+            writer.save_snapshot(client.id, "invoices", current)
+            continue
+        writer.add_pending_update(tenant_id=tenant_id, client_id=client.id, change_summary=change["summary"], **_draft(client))
+        writer.save_snapshot(client.id, "invoices", current)
+    writer.flush()
+    db.commit()
+    return len(writer.load_pending_updates())
+
+
+def main() -> None:
+    args = parse_args(__doc__, clients={"type": int, "nargs": "+", "default": [1000, 10000]})
+    configure(args.database_url)
+    from app.db import SessionLocal
+
+    counter = StatementCounter()
+    rows = []
+    for n in args.clients:
+        for label, write in (("before", write_per_row), ("after", write_batched)):
+            reset_schema()
+            tenant_id = _seed(n)
+            for scenario in ("all drafted", "no changes"):
+                db = SessionLocal()
+                try:
+                    with counter.measure() as m:
+                        created = write(db, tenant_id)
+                finally:
+                    db.close()
+                rows.append([n, scenario, label, created, m["statements"], f"{m['ms']:.0f}"])
+    rows.sort(key=lambda r: (r[0], r[1] != "all drafted", r[2] != "before"))
+    print(f"database: {args.database_url.split('://')[0]}")
+    print_table(["clients", "run", "writes", "drafts", "statements", "ms"], rows)
+
+
+if __name__ == "__main__":
+    main()
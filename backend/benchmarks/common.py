@@ -0,0 +1,71 @@
+"""
+Shared setup for the scripts in this folder. Run them from backend/ as modules, e.g.
+`python -m benchmarks.agent_run_writes --database-url postgresql://...`.
+
+The target database is emptied (all app tables dropped and recreated): point --database-url
+at a scratch database, never at one holding real data.
+"""
+import argparse
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+
+def parse_args(description: str, **extra) -> argparse.Namespace:
+    """Common --database-url option plus any extra name=(kwargs) arguments."""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(
+        "--database-url",
+        default="sqlite:///" + os.path.join(tempfile.gettempdir(), "client_update_agent_bench.db"),
+        help="scratch database (default: a SQLite file in the temp dir)",
+    )
+    for name, kwargs in extra.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", **kwargs)
+    return parser.parse_args()
+
+
+def configure(database_url: str) -> None:
+    """Point the app at database_url. Must run before anything under app/ is imported."""
+    os.environ["DATABASE_URL"] = database_url
+
+
+def reset_schema() -> None:
+    from app.db import Base, engine
+    import app.models  # noqa: F401 - register every table
+
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+
+
+class StatementCounter:
+    """Counts SQL statements sent through the app engine while active."""
+
+    def __init__(self):
+        from sqlalchemy import event
+        from app.db import engine
+
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args) -> None:
+        self.count += 1
+
+    @contextmanager
+    def measure(self) -> Iterator[dict]:
+        """Yields a dict filled with statements and ms on exit."""
+        result: dict = {}
+        start_count, start = self.count, time.perf_counter()
+        try:
+            yield result
+        finally:
+            result["statements"] = self.count - start_count
+            result["ms"] = (time.perf_counter() - start) * 1000
+
+
+def print_table(headers: list[str], rows: list[list]) -> None:
+    widths = [max(len(str(h)), *(len(str(r[i])) for r in rows)) for i, h in enumerate(headers)]
+    print("  ".join(str(h).rjust(w) for h, w in zip(headers, widths)))
+    for r in rows:
+        print("  ".join(str(v).rjust(w) for v, w in zip(r, widths)))
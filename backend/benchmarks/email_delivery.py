@@ -0,0 +1,160 @@
+"""
+Email outbox delivery against a local SMTP stand-in (aiosmtpd, `pip install aiosmtpd`).
+
+Queues --messages emails across --tenants tenants and drains them with drain_outbox, the
+same entry point the scheduler uses. One in ten recipients is refused with 550 (must end
+failed after one attempt) and one in ten gets 451 once (must be sent on the retry).
+Reports throughput, SMTP sessions opened and queue-to-accept latency_ms, and exits non-zero
+if any row ends in the wrong state or a message is delivered twice.
+
+    python -m benchmarks.email_delivery --messages 200 --smtp-delay-ms 20
+"""
+import asyncio
+import logging
+import os
+import socket
+import sys
+import time
+from collections import Counter
+
+from benchmarks.common import configure, parse_args, print_table, reset_schema
+
+
+class StandIn:
+    """aiosmtpd handler: records accepted recipients, refuses reject-*, defers retry-* once."""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.accepted: list[str] = []
+        self.sessions = 0
+        self._deferred: set[str] = set()
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        session.host_name = hostname
+        self.sessions += 1
+        return responses
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address.startswith("reject-"):
+            return "550 5.1.1 No such user"
+        if address.startswith("retry-") and address not in self._deferred:
+            self._deferred.add(address)
+            return "451 4.3.0 Try again later"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.accepted.extend(envelope.rcpt_tos)
+        return "250 Message accepted"
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _address(i: int) -> str:
+    kind = {0: "reject", 1: "retry"}.get(i % 10, "client")
+    return f"{kind}-{i}@example.com"
+
+
+def _percentile(values: list[int], p: float) -> int:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+def main() -> int:
+    args = parse_args(
+        __doc__,
+        messages={"type": int, "default": 200},
+        tenants={"type": int, "default": 4},
+        smtp_delay_ms={"type": float, "default": 0.0, "help": "stand-in delay per message"},
+    )
+    try:
+        from aiosmtpd.controller import Controller
+    except ImportError:
+        print("aiosmtpd is required: pip install aiosmtpd", file=sys.stderr)
+        return 2
+    port = _free_port()
+    os.environ.update(
+        SMTP_HOST="127.0.0.1",
+        SMTP_PORT=str(port),
+        SMTP_USE_TLS="false",
+        SMTP_USERNAME="",
+        SMTP_FROM="updates@example.com",
+        EMAIL_RATE_LIMIT_PER_MINUTE="1000000",  # measure delivery, not the per-tenant limit
+        EMAIL_BACKOFF_BASE_SECONDS="0",  # deferred rows are due again immediately
+    )
+    configure(args.database_url)
+    from app.db import SessionLocal
+    from app.models.email_outbox import EmailOutbox
+    from app.models.tenant import Tenant
+    from app.services.email_service import drain_outbox, enqueue_email, get_smtp_pool
+
+    logging.getLogger("app.services.email_service").setLevel(logging.ERROR)  # refusals here are expected
+    reset_schema()
+    handler = StandIn(args.smtp_delay_ms / 1000)
+    controller = Controller(handler, hostname="127.0.0.1", port=port)
+    controller.start()
+    db = SessionLocal()
+    try:
+        tenants = [Tenant(name=f"Bench {k}", slug=f"bench-{k}") for k in range(max(args.tenants, 1))]
+        db.add_all(tenants)
+        db.commit()
+        for i in range(args.messages):
+            enqueue_email(db, tenants[i % len(tenants)].id, _address(i), f"Update {i}", f"<p>Update {i}</p>")
+        db.commit()
+
+        start = time.perf_counter()
+        processed, passes = 0, 0
+        while passes < 5:
+            n = drain_outbox()
+            passes += 1
+            processed += n
+            if not n:
+                break
+        elapsed = time.perf_counter() - start
+        get_smtp_pool().close()
+
+        rows = db.query(EmailOutbox).all()
+    finally:
+        db.close()
+        controller.stop()
+
+    problems = []
+    by_status = Counter(r.status for r in rows)
+    for r in rows:
+        kind = r.to_address.split("-", 1)[0]
+        if kind == "reject":
+            if r.status != "failed" or r.attempts != 1 or "550" not in (r.last_error or ""):
+                problems.append(f"{r.to_address}: {r.status}, attempts {r.attempts}, expected failed after 1")
+        elif r.status != "sent" or r.latency_ms is None or r.sent_at is None:
+            problems.append(f"{r.to_address}: {r.status}, expected sent with latency")
+        elif kind == "retry" and r.attempts != 2:
+            problems.append(f"{r.to_address}: sent after {r.attempts} attempts, expected 2")
+    duplicates = [addr for addr, n in Counter(handler.accepted).items() if n > 1]
+    if duplicates:
+        problems.append(f"delivered more than once: {', '.join(duplicates[:5])}")
+
+    latencies = [r.latency_ms for r in rows if r.status == "sent" and r.latency_ms is not None]
+    sent = by_status.get("sent", 0)
+    print(f"database: {args.database_url.split('://')[0]}, stand-in delay {args.smtp_delay_ms:g} ms/message")
+    print_table(["queued", "sent", "failed", "other", "drain passes", "smtp sessions", "s", "msg/s"], [[
+        len(rows), sent, by_status.get("failed", 0), len(rows) - sent - by_status.get("failed", 0),
+        passes, handler.sessions, f"{elapsed:.2f}", f"{sent / elapsed:.0f}" if elapsed else "-",
+    ]])
+    if latencies:
+        print_table(["latency_ms", "avg", "p50", "p95", "max"], [[
+            "", sum(latencies) // len(latencies), _percentile(latencies, 0.5), _percentile(latencies, 0.95), max(latencies),
+        ]])
+    for p in problems[:20]:
+        print("FAIL", p)
+    print("ok" if not problems else f"{len(problems)} problems")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""
+Pending-updates listing: one Client query per row (before) vs the outer join in _with_client,
+over every row of a tenant with 100 / 1k / 10k updates. The paginated endpoint's first page
+(limit=100) is shown for reference. Best of --repeat runs.
+
+    python -m benchmarks.pending_updates_list --database-url sqlite:///./bench.db --rows 100 1000 10000
+"""
+from benchmarks.common import StatementCounter, configure, parse_args, print_table, reset_schema
+
+
+def _add_rows(db, tenant_id: str, start: int, count: int) -> None:
+    from sqlalchemy import insert
+    from app.models.client import Client, PendingUpdate, uuid_str
+
+    clients = [
+        {"id": uuid_str(), "tenant_id": tenant_id, "qb_customer_id": str(i), "display_name": f"Client {i}", "email": f"c{i}@example.com"}
+        for i in range(start, start + count)
+    ]
+    db.execute(insert(Client), clients)
+    db.execute(insert(PendingUpdate), [
+        {"id": uuid_str(), "tenant_id": tenant_id, "client_id": c["id"], "subject": "Update", "body_html": "<p>" + "x" * 500 + "</p>", "status": "pending"}
+        for c in clients
+    ])
+    db.commit()
+
+
+def list_per_row(db, tenant_id: str) -> int:
+    """The list endpoint before _with_client: _enrich looked up each row's client."""
+    from app.api.pending_updates import _enrich
+    from app.models.client import Client, PendingUpdate
+
+    rows = db.query(PendingUpdate).filter(PendingUpdate.tenant_id == tenant_id).order_by(PendingUpdate.created_at.desc()).all()
+    out = []
+    for p in rows:
+        client = db.query(Client).filter(Client.id == p.client_id).first()
+        out.append(_enrich(p, client.display_name if client else None, client.email if client else None))
+    return len(out)
+
+
+def list_joined(db, tenant_id: str) -> int:
+    from app.api.pending_updates import _enrich, _with_client
+    from app.models.client import PendingUpdate
+
+    rows = _with_client(db).filter(PendingUpdate.tenant_id == tenant_id).order_by(PendingUpdate.created_at.desc()).all()
+    return len([_enrich(*r) for r in rows])
+
+
+def first_page(db, tenant_id: str) -> int:
+    from fastapi import Response
+    from app.api.pending_updates import list_pending
+    from app.models.tenant import User
+
+    user = User(id="bench", tenant_id=tenant_id, email="bench@example.com")
+    return len(list_pending(Response(), status=None, limit=100, cursor=None, include_body=True, user=user, db=db))
+
+
+def main() -> None:
+    args = parse_args(
+        __doc__,
+        rows={"type": int, "nargs": "+", "default": [100, 1000, 10000]},
+        repeat={"type": int, "default": 3},
+    )
+    configure(args.database_url)
+    from app.db import SessionLocal
+    from app.models.tenant import Tenant
+
+    reset_schema()
+    counter = StatementCounter()
+    db = SessionLocal()
+    tenant = Tenant(name="Bench", slug="bench")
+    db.add(tenant)
+    db.commit()
+    tenant_id = tenant.id
+    results = []
+    have = 0
+    for n in sorted(args.rows):
+        _add_rows(db, tenant_id, have, n - have)
+        have = n
+        for label, fn in (("per-row", list_per_row), ("joined", list_joined), ("first page", first_page)):
+            best = None
+            for _ in range(args.repeat):
+                session = SessionLocal()
+                try:
+                    with counter.measure() as m:
+                        returned = fn(session, tenant_id)
+                finally:
+                    session.close()
+                best = m if best is None or m["ms"] < best["ms"] else best
+            results.append([n, label, returned, best["statements"], f"{best['ms']:.0f}"])
+    db.close()
+    print(f"database: {args.database_url.split('://')[0]}")
+    print_table(["rows", "listing", "returned", "queries", "ms"], results)
+
+
+if __name__ == "__main__":
+    main()
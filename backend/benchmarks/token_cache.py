@@ -0,0 +1,56 @@
+"""
+Access-token verification: full JWT decode (before the verified-token cache) vs decode_token
+on a token already in the cache, plus the cost decode_token adds to a first-seen token
+(verify, then insert). In-process only, no database. Best of --repeat runs of --calls calls.
+
+    python -m benchmarks.token_cache --calls 20000
+"""
+import argparse
+import time
+
+from benchmarks.common import print_table
+
+
+def _time_per_call(fn, tokens: list[str], repeat: int) -> float:
+    """Best microseconds per call of fn over tokens."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for token in tokens:
+            fn(token)
+        elapsed = (time.perf_counter() - start) / len(tokens) * 1e6
+        best = elapsed if best is None or elapsed < best else best
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    from app.auth.jwt import _decode, clear_token_cache, create_access_token, decode_token
+
+    token = create_access_token({"sub": "bench-user", "tenant_id": "bench-tenant"})
+    repeated = [token] * args.calls
+    # Distinct tokens, so every decode_token call misses (the cache is cleared between runs)
+    fresh = [create_access_token({"sub": f"bench-user-{i}", "tenant_id": "bench-tenant"}) for i in range(args.calls)]
+
+    uncached = _time_per_call(_decode, repeated, args.repeat)
+    decode_token(token)
+    cached = _time_per_call(decode_token, repeated, args.repeat)
+    misses = []
+    for _ in range(args.repeat):
+        clear_token_cache()
+        misses.append(_time_per_call(decode_token, fresh, 1))
+    clear_token_cache()
+    rows = [
+        ["full decode (before)", f"{uncached:.1f}", f"{1e6 / uncached:,.0f}"],
+        ["decode_token, cache hit", f"{cached:.1f}", f"{1e6 / cached:,.0f}"],
+        ["decode_token, first seen", f"{min(misses):.1f}", f"{1e6 / min(misses):,.0f}"],
+    ]
+    print(f"{args.calls} calls, best of {args.repeat}")
+    print_table(["verification", "us/call", "calls/s"], rows)
+
+
+if __name__ == "__main__":
+    main()
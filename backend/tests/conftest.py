@@ -0,0 +1,73 @@
+"""
+Tests run against a throwaway SQLite file, set before anything under app/ is imported.
+Run from backend/: `python -m pytest`.
+"""
+import os
+import tempfile
+
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="client-update-agent-"), "test.db")
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture
+def db():
+    """A session on a freshly created schema."""
+    import app.models  # noqa: F401 - register every table
+    from app.db import Base, SessionLocal, engine
+
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def tenant(db):
+    from app.models.tenant import Tenant
+
+    row = Tenant(name="Test", slug="test")
+    db.add(row)
+    db.commit()
+    return row
+
+
+@pytest.fixture
+def connect_quickbooks(db, monkeypatch):
+    """
+    connect(tenant_id, invoice_counts): a connected tenant with one QuickBooks customer per
+    count, each with that many new invoices. QuickBooks itself is never called.
+    """
+    from datetime import datetime, timedelta, timezone
+    from sqlalchemy import insert
+    from app.config import get_settings
+    from app.models.client import Client, uuid_str
+    from app.models.quickbooks import QuickBooksConnection
+    from app.services import agent_service
+
+    def connect(tenant_id: str, invoice_counts: list[int]) -> None:
+        db.add(QuickBooksConnection(
+            tenant_id=tenant_id,
+            realm_id="realm",
+            access_token="token",
+            refresh_token="refresh",
+            token_expires_at=datetime.now(timezone.utc) + timedelta(hours=1),
+        ))
+        db.execute(insert(Client), [
+            {"id": uuid_str(), "tenant_id": tenant_id, "qb_customer_id": str(i), "display_name": f"Client {i}", "email": f"c{i}@example.com"}
+            for i in range(len(invoice_counts))
+        ])
+        db.commit()
+        invoices = [
+            {"Id": f"{i}{k:03d}", "DocNumber": f"{i}-{k}", "TotalAmt": 100, "Balance": 100, "TxnDate": "2026-01-01", "CustomerRef": {"value": str(i)}}
+            for i, count in enumerate(invoice_counts)
+            for k in range(count)
+        ]
+        monkeypatch.setattr(get_settings(), "qb_async_sweep", False)
+        monkeypatch.setattr(agent_service, "sync_clients_from_qb", lambda db, tenant_id, customers=None: [])
+        monkeypatch.setattr(agent_service, "iter_invoices", lambda db, tenant_id: iter(invoices))
+
+    return connect
@@ -0,0 +1,96 @@
+import json
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from app.config import get_settings
+from app.models.agent_run import AgentRun
+from app.models.client import PendingUpdate
+from app.services import agent_run_service
+from app.services.agent_run_service import enqueue_agent_run, execute_agent_run
+
+settings = get_settings()
+
+
+def test_run_larger_than_a_write_batch_succeeds_on_sqlite(db, tenant, connect_quickbooks):
+    # Every client gets a template draft and a snapshot: several RunWriter flushes, with
+    # progress written on another session in between
+    clients = settings.db_write_batch_size + 100
+    connect_quickbooks(tenant.id, [1] * clients)
+    run = AgentRun(tenant_id=tenant.id, status="queued")
+    db.add(run)
+    db.commit()
+    events = []
+
+    execute_agent_run(run.id, events.append)
+
+    db.refresh(run)
+    assert run.status == "succeeded", run.error
+    assert run.clients_processed == clients
+    assert events[-1]["event"] == "done"
+    assert len(json.loads(run.created_update_ids)) == clients
+    assert db.query(PendingUpdate).count() == clients
+
+
+def test_failed_progress_write_does_not_fail_the_run(db, tenant, connect_quickbooks, monkeypatch):
+    connect_quickbooks(tenant.id, [1, 1, 1])
+    run = AgentRun(tenant_id=tenant.id, status="queued")
+    db.add(run)
+    db.commit()
+    update_run = agent_run_service._update_run
+
+    def locked_progress(run_id, expect=("running",), **fields):
+        if "clients_processed" in fields:
+            raise OperationalError("UPDATE agent_runs", {}, Exception("database is locked"))
+        return update_run(run_id, expect, **fields)
+
+    monkeypatch.setattr(agent_run_service, "_update_run", locked_progress)
+    execute_agent_run(run.id)
+
+    db.refresh(run)
+    assert run.status == "succeeded", run.error
+    assert len(json.loads(run.created_update_ids)) == 3
+
+
+def test_database_allows_one_active_run_per_tenant(db, tenant):
+    db.add_all([AgentRun(tenant_id=tenant.id, status="failed"), AgentRun(tenant_id=tenant.id, status="queued")])
+    db.commit()
+    db.add(AgentRun(tenant_id=tenant.id, status="running"))
+    with pytest.raises(IntegrityError):
+        db.commit()
+
+
+def test_enqueue_returns_the_run_another_process_queued(db, tenant, monkeypatch):
+    other = AgentRun(tenant_id=tenant.id, status="queued")
+    db.add(other)
+    db.commit()
+    submitted = []
+    monkeypatch.setattr(agent_run_service, "_executor", SimpleNamespace(submit=lambda *args: submitted.append(args)))
+    # Both processes passed the active-run check before either inserted
+    checks = iter([None])
+    get_active_run = agent_run_service.get_active_run
+    monkeypatch.setattr(agent_run_service, "get_active_run", lambda db, tenant_id: next(checks, None) or get_active_run(db, tenant_id))
+
+    run = enqueue_agent_run(db, tenant.id)
+
+    assert run.id == other.id
+    assert submitted == []
+    assert db.query(AgentRun).count() == 1
+
+
+def test_enqueue_replaces_a_stale_run(db, tenant, monkeypatch):
+    long_ago = datetime.now(timezone.utc) - timedelta(minutes=settings.agent_run_timeout_minutes + 1)
+    stale = AgentRun(tenant_id=tenant.id, status="running", created_at=long_ago, updated_at=long_ago)
+    db.add(stale)
+    db.commit()
+    submitted = []
+    monkeypatch.setattr(agent_run_service, "_executor", SimpleNamespace(submit=lambda *args: submitted.append(args)))
+
+    run = enqueue_agent_run(db, tenant.id)
+
+    assert run.id != stale.id and run.status == "queued"
+    assert [args[1] for args in submitted] == [run.id]
+    db.refresh(stale)
+    assert stale.status == "failed"
@@ -0,0 +1,132 @@
+import json
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.agents import draft_cache, update_agent
+from app.agents.draft_cache import MemoryDraftCache, draft_cache_key
+from app.config import get_settings
+from app.services import agent_service
+from app.models.client import Client, ClientCurrentSnapshot, ClientSnapshot
+from app.services.agent_service import (
+    DraftJob,
+    _draft_batch,
+    detect_invoice_changes,
+    get_last_snapshot,
+    invoice_sort_key,
+    prune_snapshot_history,
+    run_agent_for_tenant,
+)
+
+settings = get_settings()
+
+
+def _client(db, tenant_id: str, qb_id: str) -> Client:
+    client = Client(tenant_id=tenant_id, qb_customer_id=qb_id, display_name=f"Client {qb_id}")
+    db.add(client)
+    db.commit()
+    return client
+
+
+def _history(db, client_id: str, days_ago: int, payload: str) -> None:
+    created = datetime.now(timezone.utc) - timedelta(days=days_ago)
+    db.add(ClientSnapshot(client_id=client_id, snapshot_type="invoices", payload=payload, created_at=created))
+
+
+def test_prune_keeps_the_only_state_of_clients_without_a_current_snapshot(db, tenant):
+    legacy = _client(db, tenant.id, "1")
+    _history(db, legacy.id, 400, '{"count": 0, "invoices": [], "v": 1}')
+    _history(db, legacy.id, 200, '{"count": 0, "invoices": [], "v": 2}')
+    current = _client(db, tenant.id, "2")
+    _history(db, current.id, 200, '{"count": 0, "invoices": []}')
+    db.add(ClientCurrentSnapshot(client_id=current.id, snapshot_type="invoices", payload='{"count": 0, "invoices": []}', content_hash="x"))
+    db.commit()
+
+    deleted = prune_snapshot_history(db, max_age_days=90, keep=10)
+
+    assert deleted == 2
+    assert get_last_snapshot(db, legacy.id, "invoices") == {"count": 0, "invoices": [], "v": 2}
+    assert db.query(ClientSnapshot).filter(ClientSnapshot.client_id == current.id).count() == 0
+
+
+def test_prune_trims_history_beyond_keep(db, tenant):
+    client = _client(db, tenant.id, "1")
+    for days_ago in range(5):
+        _history(db, client.id, days_ago, f'{{"v": {days_ago}}}')
+    db.commit()
+
+    assert prune_snapshot_history(db, max_age_days=90, keep=2) == 3
+    assert get_last_snapshot(db, client.id, "invoices") == {"v": 0}
+
+
+def test_invoices_are_listed_in_numeric_id_order():
+    invoices = [{"Id": i} for i in ("1013", "1018", "1003", "1008", "99", "A-1")]
+    invoices.sort(key=invoice_sort_key)
+    change = detect_invoice_changes(None, {"count": len(invoices), "invoices": invoices})
+
+    assert [i["Id"] for i in change["new_invoices"]] == ["99", "1003", "1008", "1013", "1018", "A-1"]
+
+
+def _job(n: int) -> DraftJob:
+    return DraftJob(
+        client_id=str(n),
+        client_display_name=f"Client {n}",
+        client_email=f"c{n}@example.com",
+        change_summary=f"New invoice {n}",
+        company_context="",
+        snapshot={},
+    )
+
+
+def _draft(n: int) -> dict:
+    return {"subject": f"Update {n}", "body_plain": f"Body {n}", "body_html": f"<p>Body {n}</p>"}
+
+
+@pytest.fixture
+def cache(monkeypatch) -> MemoryDraftCache:
+    fresh = MemoryDraftCache(ttl_seconds=60, max_entries=100)
+    monkeypatch.setattr(draft_cache, "_cache", fresh)
+    return fresh
+
+
+@pytest.mark.parametrize("batch_fails", [False, True])
+def test_batch_fallback_looks_each_draft_up_once(cache, monkeypatch, batch_fails):
+    jobs = [_job(n) for n in range(3)]
+    cache.put(draft_cache_key("Client 0", "c0@example.com", "", "New invoice 0"), _draft(0))
+
+    def run_agent(idle, factory, prompt):
+        if factory is update_agent.create_batch_update_agent:
+            if batch_fails:
+                raise RuntimeError("LLM unavailable")
+            return json.dumps([{"index": 1, **_draft(1)}])  # no usable draft for client 2
+        return json.dumps(_draft(2 if "Client 2" in prompt else 1))
+
+    monkeypatch.setattr(update_agent, "_run_agent", run_agent)
+
+    assert _draft_batch(jobs) == [_draft(0), _draft(1), _draft(2)]
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_run_returns_updates_in_client_order(db, tenant, connect_quickbooks, cache, monkeypatch, streaming):
+    # Even clients get a template draft, odd ones (3 new invoices) go to the LLM one per
+    # request, and later clients' drafts finish first
+    connect_quickbooks(tenant.id, [1, 3, 1, 3, 1, 3])
+    monkeypatch.setattr(settings, "agent_draft_batch_size", 1)
+    monkeypatch.setattr(settings, "agent_draft_concurrency", 3)
+
+    def draft(client_display_name, client_email, change_summary, company_context="", check_cache=True):
+        time.sleep(0.05 * (6 - int(client_display_name.split()[1])))
+        return _draft(0)
+
+    monkeypatch.setattr(agent_service, "draft_client_update", draft)
+    streamed = []
+    on_update = (lambda p: streamed.append(p.client.qb_customer_id)) if streaming else None
+
+    created = run_agent_for_tenant(db, tenant.id, on_update=on_update)
+
+    assert [p.client.qb_customer_id for p in created] == ["0", "1", "2", "3", "4", "5"]
+    assert [p.draft_source for p in created] == ["template", "llm"] * 3
+    # The stream follows completion: templates first, then drafts as they finish
+    assert streamed == (["0", "2", "4", "5", "3", "1"] if streaming else [])
@@ -0,0 +1,86 @@
+import smtplib
+
+import pytest
+from apscheduler.schedulers.background import BackgroundScheduler
+
+from app.config import get_settings
+from app.models.email_outbox import EmailOutbox
+from app.services.email_service import SMTPPool, _message, drain_outbox
+from app.services.scheduler_service import build_scheduler
+
+settings = get_settings()
+
+
+class FakeSMTP:
+    """Connection stand-in: answers NOOP, and send_message raises the queued errors in turn."""
+
+    def __init__(self, errors: list[Exception]):
+        self.errors = errors
+        self.closed = False
+
+    def noop(self):
+        return (250, b"OK")
+
+    def send_message(self, msg):
+        if self.errors:
+            raise self.errors.pop(0)
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.mark.parametrize("refusal", [
+    smtplib.SMTPRecipientsRefused({"a@example.com": (550, b"No such user")}),
+    smtplib.SMTPSenderRefused(553, b"Sender rejected", "from@example.com"),
+    smtplib.SMTPDataError(451, b"Try again later"),
+])
+def test_refusal_keeps_the_connection_in_the_pool(monkeypatch, refusal):
+    conn = FakeSMTP([refusal])
+    connects = []
+    pool = SMTPPool(1)
+    monkeypatch.setattr(pool, "_connect", lambda: connects.append(conn) or conn)
+
+    with pytest.raises(type(refusal)):
+        with pool.connection() as c:
+            c.send_message(None)
+    with pool.connection() as c:
+        c.send_message(None)
+
+    assert len(connects) == 1
+    assert not conn.closed
+
+
+def test_disconnect_discards_the_connection(monkeypatch):
+    first, second = FakeSMTP([smtplib.SMTPServerDisconnected("gone")]), FakeSMTP([])
+    connects = iter([first, second])
+    pool = SMTPPool(1)
+    monkeypatch.setattr(pool, "_connect", lambda: next(connects))
+
+    with pytest.raises(smtplib.SMTPServerDisconnected):
+        with pool.connection() as c:
+            c.send_message(None)
+    with pool.connection() as c:
+        assert c is second
+
+    assert first.closed
+
+
+@pytest.mark.parametrize("smtp_from, smtp_username, sender", [
+    ("updates@example.com", "AKIAEXAMPLE", "updates@example.com"),
+    ("", "mailer@example.com", "mailer@example.com"),
+    ("", "AKIAEXAMPLE", None),
+    ("", "", None),
+])
+def test_email_is_only_dispatched_with_a_sender(monkeypatch, smtp_from, smtp_username, sender):
+    monkeypatch.setattr(settings, "smtp_host", "smtp.example.com")
+    monkeypatch.setattr(settings, "smtp_from", smtp_from)
+    monkeypatch.setattr(settings, "smtp_username", smtp_username)
+
+    jobs = {job.id for job in build_scheduler(BackgroundScheduler(timezone="UTC")).get_jobs()}
+
+    assert ("email-dispatch" in jobs) == (sender is not None)
+    if sender:
+        row = EmailOutbox(tenant_id="t", to_address="client@example.com", subject="Update", body_html="<p>Hi</p>")
+        assert _message(row)["From"] == sender
+    else:
+        assert drain_outbox() == 0
@@ -0,0 +1,27 @@
+import pytest
+
+from app.auth import password
+from app.auth.password import hash_password, shutdown_password_pool, verify_password
+from app.config import get_settings
+
+settings = get_settings()
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(settings, "password_hash_workers", 1)
+    shutdown_password_pool()
+    yield
+    shutdown_password_pool()
+
+
+def test_a_dead_worker_does_not_break_later_calls(pool):
+    hashed = hash_password("secret")
+    broken = password._pool
+    for worker in list(broken._processes.values()):
+        worker.kill()
+        worker.join()
+
+    assert verify_password("secret", hashed)
+    assert password._pool is not broken
+    assert verify_password("secret", hash_password("secret"))
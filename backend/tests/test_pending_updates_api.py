@@ -0,0 +1,43 @@
+import pytest
+from fastapi import HTTPException, Response
+from sqlalchemy import insert
+
+from app.api.pending_updates import list_pending
+from app.models.client import Client, PendingUpdate, uuid_str
+from app.models.tenant import User
+
+
+def _list(db, user: User, cursor: str | None = None, limit: int = 2) -> tuple[list[str], str | None]:
+    response = Response()
+    rows = list_pending(response, status=None, limit=limit, cursor=cursor, include_body=False, user=user, db=db)
+    return [r.id for r in rows], response.headers.get("X-Next-Cursor")
+
+
+@pytest.fixture
+def user(db, tenant) -> User:
+    client = Client(tenant_id=tenant.id, qb_customer_id="1", display_name="Client 1")
+    db.add(client)
+    db.commit()
+    db.execute(insert(PendingUpdate), [
+        {"id": uuid_str(), "tenant_id": tenant.id, "client_id": client.id, "subject": f"Update {i}", "body_html": "<p>x</p>", "status": "pending"}
+        for i in range(5)
+    ])
+    db.commit()
+    return User(id="user", tenant_id=tenant.id, email="user@example.com")
+
+
+def test_cursor_pages_through_every_row_once(db, user):
+    seen, cursor = [], None
+    while True:
+        ids, cursor = _list(db, user, cursor)
+        seen += ids
+        if not cursor:
+            break
+    assert sorted(seen) == sorted(r.id for r in db.query(PendingUpdate.id))
+
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", uuid_str()])
+def test_unknown_cursor_is_rejected(db, user, cursor):
+    with pytest.raises(HTTPException) as exc:
+        _list(db, user, cursor)
+    assert exc.value.status_code == 400
@@ -0,0 +1,42 @@
+import pytest
+
+from app.auth.deps import _load_active_user
+from app.auth.user_cache import user_cache
+from app.db import SessionLocal
+from app.models.tenant import Tenant, User
+
+
+@pytest.fixture
+def user(db, tenant) -> User:
+    row = User(tenant_id=tenant.id, email="user@example.com", hashed_password="x")
+    db.add(row)
+    db.commit()
+    user_cache.clear()
+    return row
+
+
+@pytest.mark.parametrize("model", [User, Tenant])
+def test_deactivation_is_not_undone_by_a_reload_before_commit(db, user, model):
+    admin = SessionLocal()
+    try:
+        row = admin.get(model, user.id if model is User else user.tenant_id)
+        row.is_active = False
+        admin.flush()
+        # Another request misses the cache before the commit and reloads the still-active row
+        assert _load_active_user(db, user.id) is not None
+        admin.commit()
+    finally:
+        admin.close()
+    db.expire_all()
+
+    assert _load_active_user(db, user.id) is None
+
+
+def test_a_load_that_raced_an_invalidation_is_not_cached(db, user):
+    generation = user_cache.generation()
+    loaded = db.get(User, user.id)
+    user_cache.invalidate(user.id)
+
+    user_cache.put(loaded, generation)
+
+    assert user_cache.stats()["size"] == 0
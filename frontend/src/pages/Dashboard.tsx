@@ -4,13 +4,21 @@ import { authHeaders } from '../context/AuthContext'
 import { Link } from 'react-router-dom'
 
 type QBStatus = { connected: boolean; realm_id: string | null }
+type AgentRun = {
+  id: string
+  status: 'queued' | 'running' | 'succeeded' | 'failed'
+  clients_total: number
+  clients_processed: number
+  created_update_ids: string[]
+  error: string | null
+}
 
 export default function Dashboard() {
   const [searchParams, setSearchParams] = useSearchParams()
   const [qbStatus, setQbStatus] = useState<QBStatus | null>(null)
   const [connecting, setConnecting] = useState(false)
   const [running, setRunning] = useState(false)
-  const [lastRun, setLastRun] = useState<number | null>(null)
+  const [run, setRun] = useState<AgentRun | null>(null)
 
   useEffect(() => {
     fetch('/api/qb/status', { headers: authHeaders() })
@@ -39,12 +47,30 @@ export default function Dashboard() {
       .catch(() => setConnecting(false))
   }
 
+  // Runs are queued in the background; poll until the run finishes
+  const pollRun = (id: string) => {
+    fetch(`/api/agent/runs/${id}`, { headers: authHeaders() })
+      .then((r) => (r.ok ? r.json() : Promise.reject()))
+      .then((r: AgentRun) => {
+        setRun(r)
+        if (r.status === 'queued' || r.status === 'running') {
+          setTimeout(() => pollRun(id), 1500)
+        } else {
+          setRunning(false)
+        }
+      })
+      .catch(() => setRunning(false))
+  }
+
   const runAgent = () => {
     setRunning(true)
     fetch('/api/agent/run', { method: 'POST', headers: authHeaders() })
-      .then((r) => r.json())
-      .then(() => setLastRun(Date.now()))
-      .finally(() => setRunning(false))
+      .then((r) => (r.ok ? r.json() : Promise.reject()))
+      .then((r: AgentRun) => {
+        setRun(r)
+        pollRun(r.id)
+      })
+      .catch(() => setRunning(false))
   }
 
   return (
@@ -84,8 +110,18 @@ export default function Dashboard() {
           >
             {running ? 'Running…' : 'Run agent now'}
           </button>
-          {lastRun && (
-            <p className="mt-2 text-primary-600 text-sm">Last run completed.</p>
+          {running && run && run.clients_total > 0 && (
+            <p className="mt-2 text-primary-600 text-sm">
+              {run.clients_processed} / {run.clients_total} clients processed
+            </p>
+          )}
+          {!running && run?.status === 'succeeded' && (
+            <p className="mt-2 text-primary-600 text-sm">
+              Last run completed: {run.created_update_ids.length} new draft(s).
+            </p>
+          )}
+          {!running && run?.status === 'failed' && (
+            <p className="mt-2 text-red-600 text-sm">Last run failed{run.error ? `: ${run.error}` : ''}.</p>
           )}
         </div>
       </div>
@@ -16,19 +16,38 @@ type PendingUpdate = {
 
 export default function PendingUpdates() {
   const [list, setList] = useState<PendingUpdate[]>([])
+  const [nextCursor, setNextCursor] = useState<string | null>(null)
   const [loading, setLoading] = useState(true)
   const [editingId, setEditingId] = useState<string | null>(null)
   const [editSubject, setEditSubject] = useState('')
   const [editBody, setEditBody] = useState('')
 
+  // Pages of pending drafts, newest first; X-Next-Cursor is set when more remain
+  const fetchPage = (cursor: string | null) => {
+    const params = new URLSearchParams({ status: 'pending' })
+    if (cursor) params.set('cursor', cursor)
+    return fetch(`/api/pending-updates?${params}`, { headers: authHeaders() }).then((r) =>
+      r.json().then((rows: PendingUpdate[]) => {
+        setNextCursor(r.headers.get('X-Next-Cursor'))
+        return rows
+      })
+    )
+  }
+
   const load = () => {
-    fetch('/api/pending-updates', { headers: authHeaders() })
-      .then((r) => r.json())
+    fetchPage(null)
       .then(setList)
       .catch(() => setList([]))
       .finally(() => setLoading(false))
   }
 
+  const loadMore = () => {
+    if (!nextCursor) return
+    fetchPage(nextCursor)
+      .then((rows) => setList((prev) => [...prev, ...rows]))
+      .catch(() => {})
+  }
+
   useEffect(() => {
     load()
   }, [])
@@ -143,6 +162,15 @@ export default function PendingUpdates() {
               )}
             </div>
           ))}
+          {nextCursor && (
+            <button
+              type="button"
+              onClick={loadMore}
+              className="px-4 py-2 rounded-lg border border-primary-300 text-primary-700 hover:bg-primary-100"
+            >
+              Load more
+            </button>
+          )}
         </div>
       )}
     </div>